@@ -0,0 +1,145 @@
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from cache import get_redis
+from config import (
+    ADMISSION_RATE_LIMIT, ADMISSION_RATE_WINDOW, ADMISSION_EXPENSIVE_ROWS, ADMISSION_MAX_EXPENSIVE,
+    ADMISSION_QUEUE_TIMEOUT
+)
+from metrics import ADMISSION_REJECTED, ADMISSION_WAIT
+
+# Допуск запросов, которые дошли до БД (промах кэша и снимка в памяти). Ответы из кэша
+# сюда не попадают и не платят ни за обращение к Redis, ни за оценку плана.
+RATE_LIMIT_PREFIX = "spimex:ratelimit"
+
+_expensive = asyncio.Semaphore(ADMISSION_MAX_EXPENSIVE)
+# После ошибки Redis лимит не проверяется до этого момента, чтобы не ждать соединения на каждом запросе
+_redis_retry_at = 0.0
+
+
+def too_many_requests(detail: str, retry_after: int, reason: str) -> HTTPException:
+    ADMISSION_REJECTED.labels(reason).inc()
+    return HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(max(retry_after, 1))})
+
+
+def client_id(request: Request) -> str:
+    # Адрес клиента за прокси uvicorn берет из X-Forwarded-For при --proxy-headers
+    return request.client.host if request.client else "unknown"
+
+
+async def check_rate_limit(request: Request, limit: int = ADMISSION_RATE_LIMIT, window: int = ADMISSION_RATE_WINDOW):
+    """
+    Лимит запросов к БД на клиента: фиксированное окно window секунд, счетчик в Redis
+    общий для всех воркеров. Без Redis или при его ошибке запрос пропускается.
+    """
+    global _redis_retry_at
+    redis = get_redis()
+    now = time.time()
+    if redis is None or not limit or now < _redis_retry_at:
+        return
+    window_start = int(now // window * window)
+    key = f"{RATE_LIMIT_PREFIX}:{client_id(request)}:{window_start}"
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, window)
+            count, _ = await pipe.execute()
+    except Exception as e:
+        _redis_retry_at = now + window
+        print(f"Не удалось проверить лимит запросов: {e}")
+        return
+    if count > limit:
+        raise too_many_requests(
+            f"Превышен лимит {limit} запросов к БД за {window} с", int(window_start + window - now) + 1, "rate_limit"
+        )
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN над запросом SQLAlchemy: параметры передаются драйверу, а не вставляются в текст SQL"""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def compile_explain(element, compiler, **kw):
+    return f"EXPLAIN (FORMAT JSON) {compiler.process(element.statement, **kw)}"
+
+
+def plan_rows(node: dict, workers: int = 0) -> float:
+    """
+    Наибольшая оценка строк среди сканирований плана. Оценка параллельного сканирования
+    дана на один процесс, поэтому умножается на их число.
+    """
+    workers = node.get("Workers Planned", workers)
+    rows = node["Plan Rows"]
+    if node.get("Parallel Aware") and workers:
+        rows *= workers + 1
+    children = [plan_rows(child, workers) for child in node.get("Plans", [])]
+    scanned = max(children, default=0)
+    return max(rows, scanned) if "Scan" in node["Node Type"] else scanned
+
+
+async def estimate_rows(session: AsyncSession, query) -> int:
+    """
+    Оценка количества строк по плану Postgres (EXPLAIN без выполнения запроса): наибольшая из
+    результата и сканирований. У агрегирующих запросов (analytics) результат - это
+    сгруппированные строки, а стоимость определяется прочитанными.
+    """
+    plan = await session.scalar(Explain(query))
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    top = plan[0]["Plan"]
+    return int(max(top["Plan Rows"], plan_rows(top)))
+
+
+@asynccontextmanager
+async def admit_query(session: AsyncSession, query, expensive_rows: Optional[int] = None,
+                      timeout: Optional[float] = None):
+    """
+    Тяжелые по оценке планировщика запросы выполняются не больше ADMISSION_MAX_EXPENSIVE
+    одновременно на воркер; остальные ждут в очереди до timeout секунд, затем получают 429.
+    Легкие запросы проходят без ожидания и не занимают слоты. Запрос, который не удалось
+    оценить, считается тяжелым.
+    """
+    expensive_rows = ADMISSION_EXPENSIVE_ROWS if expensive_rows is None else expensive_rows
+    timeout = ADMISSION_QUEUE_TIMEOUT if timeout is None else timeout
+    if not expensive_rows:
+        yield
+        return
+
+    rows: Optional[int] = None
+    try:
+        rows = await estimate_rows(session, query)
+    except Exception as e:
+        print(f"Не удалось оценить запрос: {e}")
+    if rows is not None and rows < expensive_rows:
+        yield
+        return
+
+    # Соединение возвращается в пул на время ожидания слота: очередь тяжелых запросов
+    # не должна занимать пул, нужный легким запросам. Сессия возьмет соединение заново.
+    await session.close()
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(_expensive.acquire(), timeout)
+    except asyncio.TimeoutError:
+        estimate = f"оценка {rows} строк" if rows is not None else "оценка недоступна"
+        raise too_many_requests(
+            f"Сервер занят тяжелыми запросами ({estimate}), сузьте период или повторите позже",
+            int(timeout) + 1, "expensive"
+        )
+    ADMISSION_WAIT.observe(time.perf_counter() - started)
+    try:
+        yield
+    finally:
+        _expensive.release()
@@ -0,0 +1,104 @@
+"""
+Время разбора страницы результатов торгов при поиске ссылок на бюллетени.
+
+    python -m benchmarks.bench_get_ref                      # сохраненные страницы из benchmarks/pages
+    python -m benchmarks.bench_get_ref page-*.html          # свои файлы
+    python -m benchmarks.bench_get_ref --fetch 5            # сначала сохранить 5 страниц со spimex.com
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import statistics
+import time
+
+import aiohttp
+
+from parser.async_pars import extract_xls_links_bs4, extract_xls_links_lxml, parse
+
+pages_folder = os.path.join(os.path.dirname(__file__), "pages")
+results_url = "https://spimex.com/markets/oil_products/trades/results/?page=page-{}&bxajaxid" \
+              "=d609bce6ada86eff0b6f7e49e6bae904"
+
+
+def make_results_page(links: int = 10) -> str:
+    """Страница в разметке раздела результатов торгов, если сохраненных страниц нет"""
+    items = "\n".join(
+        f"""
+        <div class="accordeon-inner__item">
+            <div class="accordeon-inner__header">
+                <a class="accordeon-inner__item-title link xls" href="/upload/reports/oil_xls/oil_xls_2024{i % 12 + 1:02d}{i % 28 + 1:02d}162000.xls?r=1">
+                    Бюллетень по итогам торгов в Секции «Нефтепродукты»
+                </a>
+                <a class="accordeon-inner__item-title link pdf" href="/upload/reports/oil_pdf/oil_{i}.pdf">PDF</a>
+                <div class="accordeon-inner__item-inner__title"><p>Дата: <span>{i % 28 + 1:02d}.01.2024</span></p></div>
+            </div>
+        </div>"""
+        for i in range(links)
+    )
+    menu = "\n".join(f'<li class="menu__item"><a class="menu__link" href="/section-{i}/">Раздел {i}</a></li>'
+                     for i in range(300))
+    return f"""<!DOCTYPE html><html><head><title>Итоги торгов</title></head><body>
+    <header><nav><ul class="menu">{menu}</ul></nav></header>
+    <main><div class="accordeon-inner">{items}</div></main>
+    <footer>{menu}</footer></body></html>"""
+
+
+async def fetch_pages(count: int):
+    os.makedirs(pages_folder, exist_ok=True)
+    async with aiohttp.ClientSession() as session:
+        for page in range(count):
+            html = await parse(results_url.format(page), session)
+            with open(os.path.join(pages_folder, f"page-{page}.html"), "w", encoding="utf-8") as f:
+                f.write(html)
+
+
+def measure(extract, html: str, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        extract(html)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": statistics.median(timings), "min_ms": min(timings)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pages", nargs="*", help="HTML-файлы страниц результатов")
+    parser.add_argument("--fetch", type=int, default=0, help="Сохранить N страниц со spimex.com перед замером")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.fetch:
+        asyncio.run(fetch_pages(args.fetch))
+
+    paths = [path for pattern in args.pages for path in glob.glob(pattern)] \
+        or sorted(glob.glob(os.path.join(pages_folder, "*.html")))
+    if paths:
+        pages = {}
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                pages[os.path.basename(path)] = f.read()
+    else:
+        pages = {"synthetic": make_results_page()}
+
+    report = []
+    for name, html in pages.items():
+        lxml_result = measure(extract_xls_links_lxml, html, args.repeat)
+        bs4_result = measure(extract_xls_links_bs4, html, args.repeat)
+        assert extract_xls_links_lxml(html) == extract_xls_links_bs4(html), name
+        report.append({
+            "page": name,
+            "bytes": len(html.encode()),
+            "links": len(extract_xls_links_lxml(html)),
+            "lxml": lxml_result,
+            "bs4": bs4_result,
+            "speedup": bs4_result["median_ms"] / lxml_result["median_ms"]
+        })
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
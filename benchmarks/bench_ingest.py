@@ -0,0 +1,135 @@
+"""
+Пропускная способность загрузки бюллетеней по этапам: скачивание, разбор, запись в БД.
+
+    python -m benchmarks.bench_ingest --files 20 --rows 400
+    python -m benchmarks.bench_ingest --output ingest.json
+    python -m benchmarks.bench_ingest --baseline ingest.json   # код 1 при регрессии больше 20%
+
+Бюллетени генерируются с датами в 2099 году и раздаются локальным HTTP-сервером;
+записанные строки после замера удаляются. Запускать на отдельной базе (DB_NAME).
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+import time
+from typing import Tuple
+from unittest import mock
+
+from aiohttp import web
+from sqlalchemy import delete
+
+import database as db
+from benchmarks.generate_data import generate_bulletins
+from benchmarks.report import finish
+from parser import archive, parser
+
+BENCH_END_DATE = datetime.date(2099, 12, 31)
+
+
+async def serve(folder: str):
+    app = web.Application()
+    app.router.add_static("/upload/reports/oil_xls/", folder)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/upload/reports/oil_xls/"
+
+
+async def bench_download(source: str, work: str) -> dict:
+    runner, base_url = await serve(source)
+    names = sorted(os.listdir(source))
+    with mock.patch.object(parser, "folder_path", os.path.join(work, "trades_file")), \
+            mock.patch.object(archive, "objects_folder", os.path.join(work, "archive", "objects")), \
+            mock.patch.object(archive, "urls_folder", os.path.join(work, "archive", "urls")):
+        started = time.perf_counter()
+        paths = [await parser.download_xls(base_url + name) for name in names]
+        seconds = time.perf_counter() - started
+    await runner.cleanup()
+
+    size = sum(os.path.getsize(path) for path in paths)
+    return {
+        "files": len(paths),
+        "seconds": round(seconds, 3),
+        "files_per_s": round(len(paths) / seconds, 1),
+        "mb_per_s": round(size / seconds / 2 ** 20, 2),
+    }
+
+
+def bench_parse(paths) -> Tuple[dict, list]:
+    parsed = []
+    started = time.perf_counter()
+    for path in paths:
+        trade_date = parser.trade_date_from_name(os.path.basename(path))
+        records = parser.build_records(parser.read_bulletin(path), trade_date)
+        parsed.append((trade_date, os.path.basename(path), records))
+    seconds = time.perf_counter() - started
+
+    rows = sum(len(records) for _, _, records in parsed)
+    return {
+        "files": len(parsed),
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "files_per_s": round(len(parsed) / seconds, 1),
+        "rows_per_s": round(rows / seconds, 1),
+    }, parsed
+
+
+async def bench_save(parsed) -> dict:
+    await db.init_db()
+    await db.create_table()
+    start_date = min(trade_date for trade_date, _, _ in parsed)
+    try:
+        started = time.perf_counter()
+        for trade_date, file_name, records in parsed:
+            async with db.async_session_maker() as session:
+                await parser.save_records(session, records, trade_date, file_name)
+        seconds = time.perf_counter() - started
+    finally:
+        async with db.async_session_maker() as session:
+            await session.execute(delete(db.spimex_trading_results)
+                                  .where(db.spimex_trading_results.date >= start_date))
+            await session.commit()
+        await db.close_db()
+
+    rows = sum(len(records) for _, _, records in parsed)
+    return {
+        "files": len(parsed),
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "files_per_s": round(len(parsed) / seconds, 1),
+        "rows_per_s": round(rows / seconds, 1),
+    }
+
+
+async def run(files: int, rows: int, skip_save: bool) -> dict:
+    with tempfile.TemporaryDirectory() as work:
+        source = os.path.join(work, "source")
+        paths = generate_bulletins(source, files, rows, end_date=BENCH_END_DATE)
+        report = {"download": await bench_download(source, work)}
+        report["parse"], parsed = bench_parse(paths)
+        if not skip_save:
+            report["save"] = await bench_save(parsed)
+    return report
+
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cli.add_argument("--files", type=int, default=20)
+    cli.add_argument("--rows", type=int, default=400, help="Строк договоров в бюллетене")
+    cli.add_argument("--skip-save", action="store_true", help="Не замерять запись в БД")
+    cli.add_argument("--output", help="Сохранить отчет в JSON-файл")
+    cli.add_argument("--baseline", help="Сравнить с ранее сохраненным отчетом")
+    cli.add_argument("--tolerance", type=float, default=0.2)
+    args = cli.parse_args()
+
+    report = asyncio.run(run(args.files, args.rows, args.skip_save))
+    sys.exit(finish(report, args.output, args.baseline, args.tolerance))
+
+
+if __name__ == "__main__":
+    main()
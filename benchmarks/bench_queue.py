@@ -0,0 +1,164 @@
+"""
+Масштабирование загрузки через очередь Redis: одно и то же задание обрабатывают 1, 2, 4...
+процессов-воркеров, для каждого количества - бюллетеней в секунду и эффективность
+относительно одного воркера (1.0 - линейный рост).
+
+    python -m benchmarks.bench_queue --files 40 --workers 1 2 4
+    python -m benchmarks.bench_queue --redis-url redis://localhost:6379/15 --latency 200
+    python -m benchmarks.bench_queue --output queue.json --baseline queue.json
+
+Время - от постановки ссылок в очередь до барьера завершения, без запуска процессов.
+Бюллетени генерируются с датами в 2099 году и раздаются локальным HTTP-сервером; --latency
+добавляет задержку ответа, как у spimex.com. Очередь задания в Redis (--redis-url) очищается
+перед каждым прогоном, записанные строки удаляются. Запускать на отдельной базе (DB_NAME).
+"""
+import argparse
+import asyncio
+import datetime
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from typing import List
+from unittest import mock
+
+from aiohttp import web
+from redis import asyncio as aioredis
+from sqlalchemy import delete
+
+import database as db
+from benchmarks.bench_ingest import BENCH_END_DATE
+from benchmarks.generate_data import generate_bulletins
+from benchmarks.report import finish
+from parser import archive, parser, work_queue
+
+
+async def serve(folder: str, latency: float):
+    async def bulletin(request):
+        await asyncio.sleep(latency)
+        return web.FileResponse(os.path.join(folder, request.match_info["name"]))
+
+    app = web.Application()
+    app.router.add_get("/upload/reports/oil_xls/{name}", bulletin)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/upload/reports/oil_xls/"
+
+
+async def queue_worker(redis_url: str, concurrency: int, work: str, ready):
+    await db.init_db()
+    redis = aioredis.from_url(redis_url)
+    await redis.ping()
+    ready.set()
+    # Барьер срабатывает как обычно, но без пересборки снимков и сброса кэша API
+    with mock.patch.object(parser, "folder_path", os.path.join(work, "trades_file")), \
+            mock.patch.object(archive, "objects_folder", os.path.join(work, "archive", "objects")), \
+            mock.patch.object(archive, "urls_folder", os.path.join(work, "archive", "urls")), \
+            mock.patch.object(work_queue, "finish_job", mock.AsyncMock()):
+        await work_queue.run_queue_worker(redis, concurrency, exit_when_done=True)
+    await redis.aclose()
+    await db.close_db()
+
+
+def worker_process(redis_url: str, concurrency: int, work: str, ready):
+    asyncio.run(queue_worker(redis_url, concurrency, work, ready))
+
+
+async def clean(start_date: datetime.date):
+    async with db.async_session_maker() as session:
+        await session.execute(delete(db.spimex_trading_results)
+                              .where(db.spimex_trading_results.date >= start_date))
+        await session.execute(delete(db.spimex_ingested_files)
+                              .where(db.spimex_ingested_files.date >= start_date))
+        await session.commit()
+
+
+async def bench_workers(redis, redis_url: str, urls: List[str], workers: int, concurrency: int,
+                        work: str, start_date: datetime.date) -> dict:
+    await clean(start_date)
+    await work_queue.start_job(redis, start_date)
+
+    # Время считается от постановки задания до барьера, без запуска процессов и импорта pandas
+    context = multiprocessing.get_context("spawn")
+    ready = [context.Event() for _ in range(workers)]
+    processes = [
+        context.Process(target=worker_process,
+                        args=(redis_url, concurrency, os.path.join(work, f"worker{i}"), ready[i]))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    # Ожидание в потоках: HTTP-сервер с бюллетенями работает в этом же цикле событий
+    await asyncio.gather(*(asyncio.to_thread(event.wait) for event in ready))
+
+    started = time.perf_counter()
+    await work_queue.enqueue(redis, urls)
+    await work_queue.seal(redis)
+    while not await redis.exists(work_queue.COMPLETED_KEY):
+        await asyncio.sleep(0.01)
+    seconds = time.perf_counter() - started
+    await asyncio.gather(*(asyncio.to_thread(process.join) for process in processes))
+
+    state = await work_queue.job_state(redis)
+    return {
+        "files": state["done"],
+        "failed": state["failed"],
+        "seconds": round(seconds, 3),
+        "files_per_s": round(state["done"] / seconds, 2),
+    }
+
+
+async def run(files: int, rows: int, workers: List[int], concurrency: int, latency: float, redis_url: str) -> dict:
+    await db.init_db()
+    await db.create_table()
+    redis = aioredis.from_url(redis_url)
+    report = {}
+    with tempfile.TemporaryDirectory() as work:
+        source = os.path.join(work, "source")
+        paths = generate_bulletins(source, files, rows, end_date=BENCH_END_DATE)
+        start_date = parser.trade_date_from_name(os.path.basename(paths[-1]))
+        runner, base_url = await serve(source, latency)
+        urls = [base_url + os.path.basename(path) for path in paths]
+        try:
+            for count in workers:
+                report[f"workers_{count}"] = await bench_workers(
+                    redis, redis_url, urls, count, concurrency, work, start_date
+                )
+        finally:
+            await runner.cleanup()
+            await redis.delete(*work_queue.JOB_KEYS)
+            await redis.aclose()
+            await clean(start_date)
+            await db.close_db()
+
+    base = report[f"workers_{workers[0]}"]["files_per_s"] / workers[0]
+    for count in workers:
+        result = report[f"workers_{count}"]
+        result["efficiency"] = round(result["files_per_s"] / (base * count), 2) if base else 0.0
+    return report
+
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cli.add_argument("--files", type=int, default=40)
+    cli.add_argument("--rows", type=int, default=400, help="Строк договоров в бюллетене")
+    cli.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Количества процессов-воркеров")
+    cli.add_argument("--concurrency", type=int, default=4, help="Бюллетеней одновременно в одном воркере")
+    cli.add_argument("--latency", type=float, default=100, help="Задержка ответа HTTP-сервера, мс")
+    cli.add_argument("--redis-url", default="redis://localhost:6379/15")
+    cli.add_argument("--output", help="Сохранить отчет в JSON-файл")
+    cli.add_argument("--baseline", help="Сравнить с ранее сохраненным отчетом")
+    cli.add_argument("--tolerance", type=float, default=0.2)
+    args = cli.parse_args()
+
+    report = asyncio.run(run(args.files, args.rows, args.workers, args.concurrency,
+                             args.latency / 1000, args.redis_url))
+    sys.exit(finish(report, args.output, args.baseline, args.tolerance))
+
+
+if __name__ == "__main__":
+    main()
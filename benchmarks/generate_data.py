@@ -0,0 +1,158 @@
+"""
+Синтетические данные для бенчмарков.
+
+    python -m benchmarks.generate_data rows --count 2000000            # строки в spimex_trading_results
+    python -m benchmarks.generate_data bulletins --days 30 --out DIR   # XLS-бюллетени в формате SPIMEX
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import time
+from typing import List, Optional
+
+from parser.parser import columns_mapping
+
+OIL_IDS = ["A100", "A592", "A595", "A950", "DTZ0", "DTL0", "DTE0", "JET0", "M100", "PBT0", "SNP0", "TS10"]
+BASES = {
+    "ANK": "ст. Ангарск-группа станций", "UFM": "Уфа (ст. Загородняя)", "NVY": "ст. Новоярославская",
+    "KRS": "ст. Кириши", "OMS": "ст. Комбинатская", "MSK": "Московский регион", "VLG": "ст. Волгоград",
+    "PRM": "ст. Пермь", "SMR": "ст. Самара", "NZK": "ст. Нижнекамск", "E001": "НБ Ростов",
+}
+DELIVERY_TYPES = ["F", "A", "B", "J"]
+
+# Заголовок таблицы бюллетеня: нормализуемые колонки columns_mapping плюс служебные колонки SPIMEX
+BULLETIN_HEADERS = ["№"] + list(columns_mapping) + [
+    "Изменение рыночной\nцены к цене\nпредыдущего\nдня",
+    "Цена\n(за единицу\nизмерения),\nруб.\nМинимальная",
+    "Цена\n(за единицу\nизмерения),\nруб.\nСредневзвешенная",
+    "Цена\n(за единицу\nизмерения),\nруб.\nМаксимальная",
+]
+
+
+def product_catalog() -> List[tuple]:
+    """Все сочетания (код инструмента, наименование, базис) как в бюллетенях SPIMEX"""
+    catalog = []
+    for oil_id in OIL_IDS:
+        for basis_id, basis_name in BASES.items():
+            for delivery_type in DELIVERY_TYPES:
+                code = f"{oil_id}{basis_id[:3]}060{delivery_type}"
+                catalog.append((code, f"Нефтепродукт {oil_id}, {basis_name}", basis_name))
+    return catalog
+
+
+def synthetic_trades(trade_date: datetime.date, count: int, rng: random.Random) -> List[tuple]:
+    """Строки бюллетеня: код, наименование, базис, объем, сумма в рублях, количество договоров"""
+    catalog = product_catalog()
+    trades = []
+    for code, name, basis in rng.sample(catalog, min(count, len(catalog))):
+        contracts = rng.randint(1, 30)
+        volume = contracts * 60
+        price = rng.randint(40000, 90000)
+        trades.append((code, name, basis, volume, volume * price, contracts))
+    return trades
+
+
+def write_bulletin(path: str, trade_date: datetime.date, trades: List[tuple]) -> str:
+    """XLS-файл в разметке бюллетеня SPIMEX: шапка, заголовок таблицы, строки, итоги"""
+    import xlwt
+
+    book = xlwt.Workbook(encoding="utf-8")
+    sheet = book.add_sheet("TRADE_SUMMARY")
+    sheet.write(2, 1, "Бюллетень по итогам торгов в Секции «Нефтепродукты» АО «СПбМТСБ»")
+    sheet.write(3, 1, f"Дата торгов: {trade_date:%d.%m.%Y}")
+    sheet.write(5, 1, "Секция Биржи: «Нефтепродукты» АО «СПбМТСБ»")
+    sheet.write(6, 1, "Единица измерения: Метрическая тонна")
+    for column, header in enumerate(BULLETIN_HEADERS):
+        sheet.write(7, column, header)
+    for index, trade in enumerate(trades):
+        sheet.write(8 + index, 0, index + 1)
+        for column, value in enumerate(trade, start=1):
+            sheet.write(8 + index, column, value)
+    sheet.write(8 + len(trades), 1, "Итого:")
+    sheet.write(9 + len(trades), 1, "Итого по секции:")
+    book.save(path)
+    return path
+
+
+def generate_bulletins(folder: str, days: int, rows: int, end_date: Optional[datetime.date] = None,
+                       seed: int = 0) -> List[str]:
+    """Бюллетени за последние days рабочих дней; имена как у файлов на spimex.com"""
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    trade_date = end_date or datetime.date.today()
+    paths = []
+    while len(paths) < days:
+        if trade_date.weekday() < 5:
+            path = os.path.join(folder, f"oil_xls_{trade_date:%Y%m%d}162000.xls")
+            paths.append(write_bulletin(path, trade_date, synthetic_trades(trade_date, rows, rng)))
+        trade_date -= datetime.timedelta(days=1)
+    return paths
+
+
+async def seed_rows(count: int, end_date: Optional[datetime.date] = None, rows_per_day: int = 400,
+                    batch_size: int = 50000, seed: int = 0) -> float:
+    """Заливает count строк через COPY; возвращает время в секундах"""
+    import database as db
+
+    await db.init_db()
+    await db.create_table()
+    rng = random.Random(seed)
+    catalog = product_catalog()
+    columns = ["exchange_product_id", "exchange_product_name", "oil_id", "delivery_basis_id",
+               "delivery_basis_name", "delivery_type_id", "volume", "total", "count", "date",
+               "created_on", "updated_on"]
+    now = datetime.datetime.now()
+    trade_date = end_date or datetime.date.today()
+    started = time.perf_counter()
+
+    async with db.async_engine.connect() as conn:
+        raw = (await conn.get_raw_connection()).driver_connection
+        written = 0
+        while written < count:
+            batch = []
+            while len(batch) < min(batch_size, count - written):
+                if trade_date.weekday() < 5:
+                    for code, name, basis in rng.sample(catalog, min(rows_per_day, len(catalog))):
+                        contracts = rng.randint(1, 30)
+                        volume = contracts * 60
+                        batch.append((code, name, code[:4], code[4:7], basis, code[-1], float(volume),
+                                      volume * rng.randint(40000, 90000) // 1000, contracts,
+                                      trade_date, now, now))
+                trade_date -= datetime.timedelta(days=1)
+            batch = batch[:count - written]
+            await raw.copy_records_to_table("spimex_trading_results", records=batch, columns=columns)
+            written += len(batch)
+            print(f"[ generate ] {written}/{count} rows")
+
+    await db.close_db()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rows_parser = commands.add_parser("rows", help="Синтетические строки в spimex_trading_results")
+    rows_parser.add_argument("--count", type=int, default=1_000_000)
+    rows_parser.add_argument("--rows-per-day", type=int, default=400)
+    rows_parser.add_argument("--seed", type=int, default=0)
+
+    bulletins_parser = commands.add_parser("bulletins", help="Синтетические XLS-бюллетени")
+    bulletins_parser.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "data", "bulletins"))
+    bulletins_parser.add_argument("--days", type=int, default=20)
+    bulletins_parser.add_argument("--rows", type=int, default=400)
+    bulletins_parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    if args.command == "rows":
+        seconds = asyncio.run(seed_rows(args.count, rows_per_day=args.rows_per_day, seed=args.seed))
+        print(f"{args.count} rows in {seconds:.1f} s ({args.count / seconds:.0f} rows/s)")
+    else:
+        paths = generate_bulletins(args.out, args.days, args.rows, seed=args.seed)
+        print(f"{len(paths)} bulletins written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+HTTP-нагрузка на эндпоинты /api: задержки p50/p95/p99 и RPS по сценариям, с кэшем и без.
+
+    python -m benchmarks.load_test --base-url http://localhost:8000 --requests 500 --concurrency 20
+    python -m benchmarks.load_test --only get_trading_results --output load.json
+    python -m benchmarks.load_test --baseline load.json   # код 1 при регрессии больше 20%
+
+Без кэша - запросы с заголовком Cache-Control: no-store, который fastapi-cache пропускает мимо кэша.
+Даты периодов берутся из /api/get_last_trading_dates/, поэтому нужна заполненная база
+(python -m benchmarks.generate_data rows).
+"""
+import argparse
+import asyncio
+import datetime
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.report import finish, latency_summary
+
+NO_CACHE = {"Cache-Control": "no-store"}
+
+
+def build_scenarios(dates: List[str]) -> Dict[str, dict]:
+    """Сценарий: путь и параметры запроса; периоды привязаны к последним торговым датам"""
+    last = datetime.date.fromisoformat(dates[0])
+    week, month = last - datetime.timedelta(days=7), last - datetime.timedelta(days=31)
+    return {
+        "get_last_trading_dates": {"path": "/api/get_last_trading_dates/", "params": {"limit": 30}},
+        "get_trading_results": {"path": "/api/get_trading_results/", "params": {}},
+        "get_trading_results_filtered": {"path": "/api/get_trading_results/", "params": {"oil_id": "A592"}},
+        "get_dynamics_week": {
+            "path": "/api/get_dynamics/", "params": {"start_date": str(week), "end_date": str(last)}
+        },
+        "get_dynamics_month_filtered": {
+            "path": "/api/get_dynamics/",
+            "params": {"oil_id": "A592", "start_date": str(month), "end_date": str(last)}
+        },
+        "export_month_arrow": {
+            "path": "/api/export/", "params": {"start_date": str(month), "end_date": str(last), "format": "arrow"}
+        },
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: dict, requests: int, concurrency: int,
+                       headers: dict) -> dict:
+    timings, errors = [], 0
+    queue = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in queue:
+            started = time.perf_counter()
+            try:
+                response = await client.get(scenario["path"], params=scenario["params"], headers=headers)
+                await response.aread()
+                if response.status_code >= 400:
+                    errors += 1
+                    continue
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            timings.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result = latency_summary(timings, time.perf_counter() - started)
+    result["errors"] = errors
+    return result
+
+
+async def run(base_url: str, requests: int, concurrency: int, only: List[str], warmup: int) -> Dict[str, dict]:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        response = await client.get("/api/get_last_trading_dates/", params={"limit": 1}, headers=NO_CACHE)
+        response.raise_for_status()
+        dates = response.json()["dates"]
+        if not dates:
+            raise SystemExit("База пуста: сначала python -m benchmarks.generate_data rows")
+
+        report = {}
+        for name, scenario in build_scenarios(dates).items():
+            if only and name not in only:
+                continue
+            for mode, headers in (("cached", {}), ("uncached", NO_CACHE)):
+                if mode == "cached":
+                    # прогрев: первый запрос заполняет кэш
+                    await run_scenario(client, scenario, warmup, 1, headers)
+                report[f"{name}:{mode}"] = await run_scenario(client, scenario, requests, concurrency, headers)
+    return report
+
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cli.add_argument("--base-url", default="http://localhost:8000")
+    cli.add_argument("--requests", type=int, default=500, help="Запросов на сценарий")
+    cli.add_argument("--concurrency", type=int, default=20)
+    cli.add_argument("--warmup", type=int, default=5)
+    cli.add_argument("--only", action="append", default=[], help="Запустить только указанный сценарий")
+    cli.add_argument("--output", help="Сохранить отчет в JSON-файл")
+    cli.add_argument("--baseline", help="Сравнить с ранее сохраненным отчетом")
+    cli.add_argument("--tolerance", type=float, default=0.2)
+    args = cli.parse_args()
+
+    report = asyncio.run(run(args.base_url, args.requests, args.concurrency, args.only, args.warmup))
+    sys.exit(finish(report, args.output, args.baseline, args.tolerance))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import json
+import statistics
+from typing import Dict, List
+
+
+def latency_summary(timings: List[float], seconds: float) -> dict:
+    """p50/p95/p99 в миллисекундах и пропускная способность по списку задержек в секундах"""
+    if not timings:
+        return {"requests": 0, "rps": 0.0, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+    if len(timings) == 1:
+        p50 = p95 = p99 = timings[0]
+    else:
+        quantiles = statistics.quantiles(timings, n=100, method="inclusive")
+        p50, p95, p99 = quantiles[49], quantiles[94], quantiles[98]
+    return {
+        "requests": len(timings),
+        "rps": round(len(timings) / seconds, 1) if seconds else 0.0,
+        "p50_ms": round(p50 * 1000, 2),
+        "p95_ms": round(p95 * 1000, 2),
+        "p99_ms": round(p99 * 1000, 2),
+    }
+
+
+# Метрика -> True, если большее значение лучше
+COMPARED_METRICS = {
+    "rps": True, "files_per_s": True, "rows_per_s": True, "mb_per_s": True,
+    "p50_ms": False, "p95_ms": False, "p99_ms": False,
+}
+
+
+def compare_reports(baseline: Dict[str, dict], current: Dict[str, dict], tolerance: float) -> List[str]:
+    """Регрессии текущего отчета относительно базового больше чем на tolerance (доля)"""
+    regressions = []
+    for name, result in current.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append(f"{name}: {metric} {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def finish(report: Dict[str, dict], output: str = None, baseline: str = None, tolerance: float = 0.2) -> int:
+    """Печатает отчет, сохраняет его и сравнивает с базовым; код возврата 1 при регрессии"""
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            regressions = compare_reports(json.load(f), report, tolerance)
+        for regression in regressions:
+            print(f"[ regression ] {regression}")
+        return 1 if regressions else 0
+    return 0
@@ -3,32 +3,50 @@ import os
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
 from fastapi_cache.decorator import cache
+from fastapi_cache.key_builder import default_key_builder
 from redis import asyncio as aioredis
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, time, timedelta
 import asyncio
 from config import REDIS_HOST, REDIS_PORT, REDIS_DB
+from metrics import InstrumentedBackend
 
 
 
 TESTING = os.getenv("TESTING", "False").lower() == "true"
 
 
+def cache_key_builder(func, namespace: str = "", *, request=None, response=None, args=(), kwargs=None):
+    """Ключ по аргументам эндпоинта без сессии БД, у которой свой repr на каждый запрос"""
+    kwargs = {name: value for name, value in (kwargs or {}).items() if not isinstance(value, AsyncSession)}
+    return default_key_builder(func, namespace, request=request, response=response, args=args, kwargs=kwargs)
+
+
 async def init_redis():
     """Инициализация Redis подключения"""
     if TESTING:
         # В тестовом режиме используем InMemoryBackend
         from fastapi_cache.backends.inmemory import InMemoryBackend
-        FastAPICache.init(InMemoryBackend())
+        FastAPICache.init(InstrumentedBackend(InMemoryBackend()), prefix="fastapi-cache", key_builder=cache_key_builder)
         return None
+    # Без decode_responses: JsonCoder fastapi-cache декодирует байты сам, а сжатые ответы хранятся как есть
     redis = aioredis.from_url(
         f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}",
-        encoding="utf8",
-        decode_responses=True
+        encoding="utf8"
     )
-    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+    FastAPICache.init(InstrumentedBackend(RedisBackend(redis)), prefix="fastapi-cache", key_builder=cache_key_builder)
     return redis
 
 
+def get_redis():
+    """Клиент Redis из бэкенда кэша; None, если кэш не инициализирован или работает в памяти"""
+    try:
+        backend = FastAPICache.get_backend()
+    except AssertionError:
+        return None
+    return getattr(backend, "redis", None)
+
+
 def get_cache_expiration():
     """Вычисляет время до 14:11 следующего дня"""
     now = datetime.now()
@@ -51,6 +69,12 @@ def cache_until_1411():
     return cache(expire=get_cache_expiration())
 
 
+async def invalidate_cache():
+    """Удаляет закэшированные ответы API, не затрагивая остальные ключи Redis"""
+    await FastAPICache.clear()
+    print(f"Кэш сброшен в {datetime.now()}")
+
+
 async def clear_cache_daily():
     """Фоновая задача для очистки кэша в 14:11"""
     while True:
@@ -65,6 +89,5 @@ async def clear_cache_daily():
         wait_seconds = (wait_until - now).total_seconds()
         await asyncio.sleep(wait_seconds)
 
-        redis = FastAPICache.get_backend().redis
-        await redis.flushall()
-        print(f"Кэш очищен в {datetime.now()}")
+        # Только ключи fastapi-cache: в том же Redis лежат очередь загрузки, версия данных и лимиты
+        await invalidate_cache()
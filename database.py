@@ -1,10 +1,21 @@
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
-from sqlalchemy.orm import declarative_base
-from sqlalchemy import select, func, distinct, and_
+from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy import select, update, func, distinct, and_
 from sqlalchemy import text, Text, Integer, Float, DateTime, Date, Column
-from typing import List, Optional, AsyncGenerator
-from datetime import date
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool
+from typing import List, Optional, Set, Tuple, AsyncGenerator
+from contextlib import asynccontextmanager
+import asyncio
+import itertools
+import time
+from datetime import date, datetime
 from config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+from config import (
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_PING_STRATEGY, DB_STATEMENT_CACHE_SIZE,
+    DB_REPLICA_URLS, DB_REPLICA_RETRY_AFTER, DB_REPLICA_PRIMARY_WINDOW
+)
+from metrics import TimedQueuePool, instrument_engine
 
 Base = declarative_base()
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
@@ -28,29 +39,200 @@ class spimex_trading_results(Base):
     updated_on = Column(DateTime)
 
 
+class spimex_ingested_files(Base):
+    __tablename__ = "spimex_ingested_files"
+
+    sha256 = Column(Text, primary_key=True)
+    file_name = Column(Text)
+    date = Column(Date)
+    ingested_on = Column(DateTime)
+
+
+class spimex_ingest_runs(Base):
+    """Запуск загрузки: страница, на которой он остановился, и статус running/finished"""
+    __tablename__ = "spimex_ingest_runs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(Text)
+    status = Column(Text)
+    last_page = Column(Integer, default=0)
+    started_on = Column(DateTime)
+    finished_on = Column(DateTime)
+
+
+class spimex_ingest_checkpoints(Base):
+    """Обработанная ссылка запуска; записывается в одной транзакции со строками файла"""
+    __tablename__ = "spimex_ingest_checkpoints"
+
+    run_id = Column(Integer, primary_key=True)
+    url = Column(Text, primary_key=True)
+    page = Column(Integer)
+    processed_on = Column(DateTime)
+
+
+class ReplicaRouter:
+    """Выбор реплики для чтения по кругу; недоступная реплика пропускается DB_REPLICA_RETRY_AFTER секунд"""
+
+    def __init__(self, engines: List[AsyncEngine], retry_after: float = DB_REPLICA_RETRY_AFTER):
+        self.engines = engines
+        self.retry_after = retry_after
+        self.unhealthy_until = {}
+        self._counter = itertools.count()
+
+    def is_healthy(self, engine: AsyncEngine) -> bool:
+        return self.unhealthy_until.get(id(engine), 0) <= time.monotonic()
+
+    def mark_unhealthy(self, engine: AsyncEngine):
+        self.unhealthy_until[id(engine)] = time.monotonic() + self.retry_after
+        print(f"Реплика {engine.url.host}:{engine.url.port} недоступна, чтение переключено")
+
+    def mark_healthy(self, engine: AsyncEngine):
+        self.unhealthy_until.pop(id(engine), None)
+
+    def next_engine(self, exclude=()) -> Optional[AsyncEngine]:
+        start = next(self._counter)
+        for offset in range(len(self.engines)):
+            engine = self.engines[(start + offset) % len(self.engines)]
+            if engine not in exclude and self.is_healthy(engine):
+                return engine
+        return None
+
+    async def check_health(self):
+        for engine in self.engines:
+            try:
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+                self.mark_healthy(engine)
+            except PoolTimeoutError:
+                # Пул занят запросами - реплика работает, ее состояние не меняется
+                continue
+            except (OSError, DBAPIError):
+                self.mark_unhealthy(engine)
+
+    async def dispose(self):
+        for engine in self.engines:
+            await engine.dispose()
+
+
+class ReadSession(Session):
+    """
+    Синхронная часть сессии чтения: реплика выбирается при первом запросе, а не при открытии
+    сессии, поэтому ответ из кэша не занимает соединение реплики. Недоступная реплика
+    пропускается, запрос идет на следующую, затем на основную БД.
+    """
+
+    def __init__(self, *args, router: ReplicaRouter, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.router = router
+        self.read_bind = None
+
+    def get_bind(self, mapper=None, **kwargs):
+        if self.read_bind is None:
+            self.read_bind = self.probe_replica() or super().get_bind(mapper, **kwargs)
+        return self.read_bind
+
+    def probe_replica(self):
+        """
+        Первая реплика, к которой удалось подключиться; соединение сразу возвращается в пул
+        и достается сессии. Вызывается при первом запросе внутри greenlet сессии, поэтому
+        синхронный connect здесь допустим. Таймаут пула - это нагрузка, а не сбой реплики:
+        он не переключает чтение на основную БД и возвращается клиенту как есть.
+        """
+        tried = []
+        while (replica := self.router.next_engine(exclude=tried)) is not None:
+            tried.append(replica)
+            try:
+                replica.sync_engine.connect().close()
+            except (OSError, DBAPIError):
+                self.router.mark_unhealthy(replica)
+                continue
+            return replica.sync_engine
+        return None
+
+
 async_engine: Optional[AsyncEngine] = None
 async_session_maker: Optional[async_sessionmaker] = None
+replica_router: Optional[ReplicaRouter] = None
+# До этого момента (time.monotonic) чтение идет с основной БД, см. pin_reads_to_primary
+_primary_until = 0.0
 
 __all__ = [
     'get_async_session',
+    'get_read_session',
+    'check_replicas',
+    'pin_reads_to_primary',
+    'advisory_lock',
+    'init_db',
+    'close_db',
+    'build_engine',
     'async_session_maker',
     'spimex_trading_results',
+    'spimex_ingested_files',
+    'spimex_ingest_runs',
+    'spimex_ingest_checkpoints',
+    'is_file_ingested',
+    'get_unfinished_run',
+    'start_ingest_run',
+    'get_run_progress',
+    'set_run_page',
+    'finish_ingest_run',
     'truncate_table',
     'create_table',
     'get_last_trading_dates',
+    'get_last_trading_date',
     'get_trading_dynamics',
     'get_last_trading_results'
 ]
 
 
+_init_lock = asyncio.Lock()
+
+
+def build_engine(url: str = DATABASE_URL, **options) -> AsyncEngine:
+    """Движок с настройками пула из конфигурации; options переопределяют их"""
+    settings = {
+        "poolclass": TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_PING_STRATEGY == "pre_ping",
+        "connect_args": {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+    }
+    connect_args = {**settings["connect_args"], **options.pop("connect_args", {})}
+    settings.update(options, connect_args=connect_args)
+    engine = create_async_engine(url, **settings)
+    instrument_engine(engine)
+    return engine
+
+
 async def init_db():
-    global async_engine, async_session_maker
-    async_engine = create_async_engine(DATABASE_URL, pool_pre_ping=True)
-    async_session_maker = async_sessionmaker(
-        bind=async_engine,
-        class_=AsyncSession,
-        expire_on_commit=False
-    )
+    """Однократно создает движок и фабрику сессий; повторные и параллельные вызовы безопасны"""
+    global async_engine, async_session_maker, replica_router
+    if async_session_maker is not None:
+        return
+    async with _init_lock:
+        if async_session_maker is not None:
+            return
+        async_engine = build_engine()
+        if DB_REPLICA_URLS:
+            replica_router = ReplicaRouter([build_engine(url) for url in DB_REPLICA_URLS])
+        async_session_maker = async_sessionmaker(
+            bind=async_engine,
+            class_=AsyncSession,
+            expire_on_commit=False
+        )
+
+
+async def close_db():
+    global async_engine, async_session_maker, replica_router
+    if replica_router is not None:
+        await replica_router.dispose()
+    if async_engine is not None:
+        await async_engine.dispose()
+    async_engine = None
+    async_session_maker = None
+    replica_router = None
 
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
@@ -64,13 +246,69 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    """Сессия для запросов только на чтение: реплика, если настроена и доступна, иначе основная БД"""
+    if not async_session_maker:
+        await init_db()
+
+    if replica_router is None or time.monotonic() < _primary_until:
+        async with async_session_maker() as session:
+            yield session
+        return
+
+    async with async_session_maker(sync_session_class=ReadSession, router=replica_router) as session:
+        yield session
+
+
+def pin_reads_to_primary(seconds: float = DB_REPLICA_PRIMARY_WINDOW):
+    """
+    Чтение с основной БД на seconds секунд: после загрузки реплики могут еще не содержать
+    новый торговый день, а ответы, закэшированные под новой версией, живут до следующей загрузки
+    """
+    global _primary_until
+    _primary_until = max(_primary_until, time.monotonic() + seconds)
+
+
+async def check_replicas():
+    """Фоновая задача: периодическая проверка реплик, в том числе возврат восстановившихся"""
+    while True:
+        await asyncio.sleep(DB_REPLICA_RETRY_AFTER)
+        if replica_router is not None:
+            await replica_router.check_health()
+
+
+@asynccontextmanager
+async def advisory_lock(key: int):
+    """
+    Session-level advisory lock в Postgres без ожидания: возвращает True, если блокировка
+    взята. Держится на выделенном соединении и снимается сервером, если процесс упадет.
+    Соединение открывается вне пула запросов (NullPool): блокировка ведущего держится все окно
+    опроса, и соединение из пула на это время уменьшило бы DB_POOL_SIZE для API.
+    """
+    lock_engine = create_async_engine(async_engine.url, poolclass=NullPool)
+    try:
+        async with lock_engine.connect() as conn:
+            locked = await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": key})
+            await conn.commit()
+            try:
+                yield bool(locked)
+            finally:
+                if locked:
+                    await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+                    await conn.commit()
+    finally:
+        await lock_engine.dispose()
+
+
 def get_engine_and_session():
     return async_engine, async_session_maker
 
 
 async def truncate_table(session: AsyncSession):
     try:
-        await session.execute(text("TRUNCATE TABLE spimex_trading_results RESTART IDENTITY CASCADE"))
+        await session.execute(text(
+            "TRUNCATE TABLE spimex_trading_results, spimex_ingested_files RESTART IDENTITY CASCADE"
+        ))
         await session.commit()
         print("Таблица успешно очищена с сбросом идентификаторов")
         return True
@@ -96,6 +334,51 @@ async def async_insert_to_db(obj: spimex_trading_results, session):
     await session.commit()
 
 
+async def is_file_ingested(session: AsyncSession, sha256: str) -> bool:
+    query = select(spimex_ingested_files.sha256).where(spimex_ingested_files.sha256 == sha256)
+    result = await session.execute(query)
+    return result.scalar() is not None
+
+
+async def get_unfinished_run(session: AsyncSession, kind: str) -> Optional[spimex_ingest_runs]:
+    query = select(spimex_ingest_runs) \
+        .where(spimex_ingest_runs.kind == kind, spimex_ingest_runs.status == "running") \
+        .order_by(spimex_ingest_runs.id.desc()) \
+        .limit(1)
+    result = await session.execute(query)
+    return result.scalar()
+
+
+async def start_ingest_run(session: AsyncSession, kind: str) -> spimex_ingest_runs:
+    run = spimex_ingest_runs(kind=kind, status="running", last_page=0, started_on=datetime.now())
+    session.add(run)
+    await session.commit()
+    return run
+
+
+async def get_run_progress(session: AsyncSession, run_id: int) -> Tuple[int, Set[str]]:
+    """Страница, с которой продолжается запуск, и уже обработанные ссылки"""
+    last_page = await session.scalar(select(spimex_ingest_runs.last_page).where(spimex_ingest_runs.id == run_id))
+    result = await session.execute(
+        select(spimex_ingest_checkpoints.url).where(spimex_ingest_checkpoints.run_id == run_id)
+    )
+    return last_page or 0, set(result.scalars().all())
+
+
+async def set_run_page(session: AsyncSession, run_id: int, page: int):
+    await session.execute(update(spimex_ingest_runs).where(spimex_ingest_runs.id == run_id).values(last_page=page))
+    await session.commit()
+
+
+async def finish_ingest_run(session: AsyncSession, run_id: int):
+    await session.execute(
+        update(spimex_ingest_runs)
+        .where(spimex_ingest_runs.id == run_id)
+        .values(status="finished", finished_on=datetime.now())
+    )
+    await session.commit()
+
+
 async def get_last_trading_dates(session: AsyncSession, limit: int) -> List[date]:
     query = select(distinct(spimex_trading_results.date)) \
         .order_by(spimex_trading_results.date.desc()) \
@@ -105,6 +388,11 @@ async def get_last_trading_dates(session: AsyncSession, limit: int) -> List[date
     return [row[0] for row in result.all()]
 
 
+async def get_last_trading_date(session: AsyncSession) -> Optional[date]:
+    result = await session.execute(select(func.max(spimex_trading_results.date)))
+    return result.scalar()
+
+
 async def get_trading_dynamics(
         session: AsyncSession,
         oil_id: Optional[str] = None,
@@ -0,0 +1,133 @@
+import asyncio
+import json
+from contextlib import contextmanager
+from datetime import date
+from typing import AsyncIterator, Dict, Optional, Set
+
+import database as db
+from cache import get_redis
+from schemas import TradingResultResponse
+
+# События о новых торговых днях. Каждый воркер держит одну подписку на канал Redis
+# и раздает события локальным очередям SSE-клиентов, поэтому простаивающий подписчик
+# стоит одну корутину и очередь, а не запрос к API раз в несколько секунд.
+EVENTS_CHANNEL = "spimex:events"
+HEARTBEAT_INTERVAL = 15
+QUEUE_SIZE = 16
+RECONNECT_DELAY = 5
+
+
+class EventHub:
+    def __init__(self):
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.last_event: Optional[dict] = None
+        self._diffs: Dict[str, asyncio.Task] = {}
+
+    @contextmanager
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self.subscribers.discard(queue)
+
+    def broadcast(self, event: dict):
+        self.last_event = event
+        # Результаты нового дня загружаются один раз на событие, а не на каждого подписчика
+        self._diffs = {}
+        for queue in self.subscribers:
+            if queue.full():
+                # Отстающему клиенту важнее последнее событие, чем вся история
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def diff(self, event: dict) -> str:
+        """JSON со строками торгов дня из события; общий для всех подписчиков"""
+        task = self._diffs.get(event["date"])
+        if task is None:
+            task = asyncio.create_task(load_day_results(date.fromisoformat(event["date"])))
+            self._diffs[event["date"]] = task
+        # shield: отключение первого клиента не должно отменять загрузку для остальных
+        return await asyncio.shield(task)
+
+    async def listen(self):
+        """Фоновая задача воркера: подписка на канал Redis с переподключением"""
+        redis = get_redis()
+        if redis is None:
+            return
+        while True:
+            try:
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(EVENTS_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.broadcast(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Подписка на события прервана: {e}")
+                await asyncio.sleep(RECONNECT_DELAY)
+
+
+hub = EventHub()
+
+
+async def load_day_results(trade_date: date) -> str:
+    # С основной БД: реплика могла еще не получить только что загруженный день
+    async with db.async_session_maker() as session:
+        trades = await db.get_trading_dynamics(session, start_date=trade_date, end_date=trade_date)
+    return json.dumps(
+        [TradingResultResponse.model_validate(trade).model_dump(mode="json", by_alias=True) for trade in trades],
+        ensure_ascii=False
+    )
+
+
+async def publish_trading_day(trade_date: Optional[date], version: Optional[str] = None):
+    """Сообщает подписчикам всех воркеров о новом торговом дне"""
+    if trade_date is None:
+        return
+    event = {"date": trade_date.isoformat(), "version": version}
+    redis = get_redis()
+    if redis is not None:
+        await redis.publish(EVENTS_CHANNEL, json.dumps(event))
+    else:
+        hub.broadcast(event)
+
+
+def format_event(event: dict, diff: Optional[str] = None) -> str:
+    data = json.dumps(event, ensure_ascii=False)
+    if diff is not None:
+        # Готовый JSON строк дня вставляется как есть, без повторной сериализации на каждого клиента
+        data = f'{data[:-1]}, "results": {diff}}}'
+    event_id = f"id: {event['version']}\n" if event.get("version") else ""
+    return f"event: trading_day\n{event_id}data: {data}\n\n"
+
+
+async def event_stream(queue: asyncio.Queue, with_diff: bool = False,
+                       last_event_id: Optional[str] = None) -> AsyncIterator[str]:
+    """Поток Server-Sent Events: новые торговые дни и комментарии-пинги для прокси"""
+    yield f"retry: {RECONNECT_DELAY * 1000}\n\n"
+
+    # Клиент переподключился и пропустил событие - отдаем последнее сразу
+    missed = hub.last_event
+    if last_event_id and missed and missed.get("version") and missed["version"] != last_event_id:
+        yield await render(missed, with_diff)
+
+    while True:
+        try:
+            event = await asyncio.wait_for(queue.get(), HEARTBEAT_INTERVAL)
+        except asyncio.TimeoutError:
+            yield ": ping\n\n"
+            continue
+        yield await render(event, with_diff)
+
+
+async def render(event: dict, with_diff: bool) -> str:
+    if not with_diff:
+        return format_event(event)
+    try:
+        return format_event(event, await hub.diff(event))
+    except Exception as e:
+        print(f"Не удалось загрузить результаты за {event['date']}: {e}")
+        return format_event(event)
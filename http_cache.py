@@ -0,0 +1,281 @@
+import asyncio
+import gzip
+from datetime import date
+from typing import Optional, Tuple
+
+from fastapi_cache import FastAPICache
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import database as db
+from cache import get_cache_expiration, get_redis
+from config import DATA_VERSION_POLL_INTERVAL
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Версия данных: дата последних торгов в БД и счетчик обновлений.
+# Счетчик общий для всех воркеров и хранится в Redis, сама версия - в памяти процесса,
+# чтобы условный запрос с If-None-Match не обращался ни к Redis, ни к Postgres.
+VERSION_COUNTER_KEY = "spimex:data-version:counter"
+VERSION_DATE_KEY = "spimex:data-version:date"
+
+_version: Optional[str] = None
+
+
+def set_data_version(last_date: Optional[date], counter: int):
+    global _version
+    version = f"{last_date:%Y%m%d}-{counter}" if last_date else f"empty-{counter}"
+    if _version is not None and version != _version:
+        # Новые данные: прогрев и первые промахи кэша читают с основной БД, а не с отстающей реплики
+        db.pin_reads_to_primary()
+    _version = version
+
+
+def current_version() -> Optional[str]:
+    return _version
+
+
+def current_etag() -> Optional[str]:
+    """Слабый ETag текущей версии данных; None, пока версия не загружена"""
+    return f'W/"{_version}"' if _version else None
+
+
+async def load_data_version(session: AsyncSession):
+    """Версия при запуске воркера: дата из БД и текущий счетчик из Redis"""
+    last_date = await db.get_last_trading_date(session)
+    redis = get_redis()
+    counter = 0
+    if redis:
+        try:
+            counter = int(await redis.get(VERSION_COUNTER_KEY) or 0)
+        except Exception as e:
+            # Воркер запускается и без Redis; счетчик подтянет watch_data_version
+            print(f"Не удалось получить версию данных: {e}")
+    set_data_version(last_date, counter)
+
+
+async def publish_data_version(session: AsyncSession) -> Optional[date]:
+    """
+    Новая версия после загрузки или обновления данных; остальные воркеры подхватят ее из Redis.
+    Возвращает дату последних торгов.
+    """
+    last_date = await db.get_last_trading_date(session)
+    redis = get_redis()
+    if redis:
+        counter = await redis.incr(VERSION_COUNTER_KEY)
+        await redis.set(VERSION_DATE_KEY, last_date.isoformat() if last_date else "")
+    else:
+        counter = int(_version.rsplit("-", 1)[1]) + 1 if _version else 1
+    set_data_version(last_date, counter)
+    print(f"Версия данных: {_version}")
+    return last_date
+
+
+async def sync_data_version():
+    redis = get_redis()
+    if not redis:
+        return
+    counter, last_date = await redis.mget(VERSION_COUNTER_KEY, VERSION_DATE_KEY)
+    if counter is not None:
+        set_data_version(date.fromisoformat(last_date.decode()) if last_date else None, int(counter))
+
+
+async def watch_data_version():
+    """Фоновая задача: сверяет версию данных с Redis"""
+    while True:
+        await asyncio.sleep(DATA_VERSION_POLL_INTERVAL)
+        try:
+            await sync_data_version()
+        except Exception as e:
+            print(f"Не удалось получить версию данных: {e}")
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Слабое сравнение ETag из If-None-Match (RFC 9110, 13.1.2)"""
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
+
+
+class ConditionalGetMiddleware:
+    """
+    ASGI middleware: ETag и Cache-Control для GET-запросов к /api. Если ETag клиента
+    совпадает с текущей версией данных, сразу отвечает 304 Not Modified без вызова эндпоинта.
+
+    Cache-Control: no-cache - клиент и прокси хранят ответ, но перед использованием сверяют
+    ETag: версия данных меняется после загрузки бюллетеня, а не по истечении max-age.
+    Потоковые выгрузки (exclude) проходят без ETag и Cache-Control.
+    """
+
+    def __init__(self, app, prefix: str = "/api/", exclude: Tuple[str, ...] = ("/api/export/",)):
+        self.app = app
+        self.prefix = prefix
+        self.exclude = exclude
+
+    async def __call__(self, scope, receive, send):
+        etag = current_etag()
+        if scope["type"] != "http" or scope["method"] != "GET" or etag is None \
+                or not scope["path"].startswith(self.prefix) or scope["path"].startswith(self.exclude):
+            await self.app(scope, receive, send)
+            return
+
+        headers = [
+            (b"etag", etag.encode()),
+            (b"cache-control", b"no-cache"),
+        ]
+        if_none_match = next((value.decode("latin-1") for name, value in scope["headers"]
+                              if name == b"if-none-match"), None)
+        if if_none_match and etag_matches(if_none_match, etag):
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                # fastapi-cache ставит свои ETag (хэш тела) и max-age (остаток TTL) - заменяем на версию данных
+                message["headers"] = [(name, value) for name, value in message.get("headers", [])
+                                      if name not in (b"etag", b"cache-control")] + headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
+
+
+# Сжатие ответов: тела меньше MINIMUM_SIZE не сжимаются, большие сжимаются в отдельном потоке
+MINIMUM_SIZE = 500
+THREAD_SIZE = 64 * 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Кодировка из Accept-Encoding с учетом q; при равном весе brotli предпочтительнее gzip"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    supported = ["br", "gzip"] if brotli else ["gzip"]
+    weight, _, encoding = max((weights.get(name, weights.get("*", 0.0)), -i, name) for i, name in enumerate(supported))
+    return encoding if weight > 0 else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def versioned_key(namespace: str, key: str) -> Optional[str]:
+    """
+    Ключ кэша, привязанный к версии данных; None, пока версия не загружена.
+    Префикс fastapi-cache, чтобы invalidate_cache удалял и эти ключи.
+    """
+    if not _version:
+        return None
+    return f"{FastAPICache.get_prefix()}:{namespace}:{_version}:{key}"
+
+
+async def cache_get(key: str) -> Optional[bytes]:
+    try:
+        return await FastAPICache.get_backend().get(key)
+    except Exception:
+        # Недоступный кэш не должен ломать ответ - как и в декораторе fastapi-cache
+        return None
+
+
+async def cache_set(key: str, value: bytes):
+    try:
+        await FastAPICache.get_backend().set(key, value, get_cache_expiration())
+    except Exception:
+        pass
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware: gzip/brotli для JSON-ответов /api по Accept-Encoding. Сжатое тело
+    сохраняется в кэше под ключом с версией данных, поэтому горячий ответ сжимается
+    один раз на версию, а не на каждый запрос.
+    """
+
+    def __init__(self, app, prefix: str = "/api/", minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.prefix = prefix
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = dict(scope["headers"])
+        encoding = negotiate_encoding(request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = None
+        cache_control = request_headers.get(b"cache-control", b"")
+        if b"no-store" not in cache_control and b"no-cache" not in cache_control:
+            query = scope.get("query_string", b"").decode("latin-1")
+            key = versioned_key("compressed", f"{encoding}:{scope['path']}?{query}")
+        if key:
+            body = await cache_get(key)
+            if body is not None:
+                await self.send_compressed(send, [(b"content-type", b"application/json")], body, encoding)
+                return
+
+        start, chunks, passthrough = None, [], False
+
+        async def buffer(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                passthrough = message["status"] != 200 \
+                    or not headers.get(b"content-type", b"").startswith(b"application/json") \
+                    or b"content-encoding" in headers
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message
+                return
+            if passthrough:
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            if len(body) < self.minimum_size:
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            if len(body) > THREAD_SIZE:
+                body = await asyncio.to_thread(compress, body, encoding)
+            else:
+                body = compress(body, encoding)
+            if key:
+                await cache_set(key, body)
+            headers = [(name, value) for name, value in start.get("headers", []) if name != b"content-length"]
+            await self.send_compressed(send, headers, body, encoding, start["status"])
+
+        await self.app(scope, receive, buffer)
+
+    @staticmethod
+    async def send_compressed(send, headers, body: bytes, encoding: str, status: int = 200):
+        headers = headers + [
+            (b"content-encoding", encoding.encode()),
+            (b"content-length", str(len(body)).encode()),
+            (b"vary", b"Accept-Encoding"),
+        ]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -5,21 +5,40 @@ from fastapi_cache import FastAPICache
 from fastapi.params import Depends
 from fastapi.middleware.cors import CORSMiddleware
 from routers import main_router
+from metrics import MetricsMiddleware
+from http_cache import CompressionMiddleware, ConditionalGetMiddleware, load_data_version, watch_data_version
 from cache import init_redis, clear_cache_daily
+from events import hub
+from memory_snapshot import keep_snapshot_fresh
 from contextlib import asynccontextmanager
-from database import init_db, create_table
-from config import DEBUG
+import database as db
+from database import init_db, close_db, check_replicas
+from config import DEBUG, SCHEDULER_ENABLED, SCHEDULER_IN_API, DB_REPLICA_URLS, MEMORY_SNAPSHOT_DAYS
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Инициализация при запуске
     print("Инициализация приложения...")
+    # Схема БД создается отдельно: python manage.py create-schema
     await init_db()
-    await create_table()
     await init_redis()
+    async with db.async_session_maker() as session:
+        await load_data_version(session)
+    asyncio.create_task(watch_data_version())
+    asyncio.create_task(hub.listen())
+    if MEMORY_SNAPSHOT_DAYS:
+        asyncio.create_task(keep_snapshot_fresh())
 
-    asyncio.create_task(clear_cache_daily())
+    if SCHEDULER_ENABLED:
+        # Кэш сбрасывается после загрузки нового бюллетеня, а не в фиксированное время
+        if SCHEDULER_IN_API:
+            from scheduler import ingestion_scheduler  # тянет за собой стек парсера
+            asyncio.create_task(ingestion_scheduler(app))
+    else:
+        asyncio.create_task(clear_cache_daily())
+    if DB_REPLICA_URLS:
+        asyncio.create_task(check_replicas())
 
     print("Приложение инициализировано")
 
@@ -27,6 +46,7 @@ async def lifespan(app: FastAPI):
 
     # Действия при остановке
     print("Приложение завершает работу")
+    await close_db()
 
 
 app = FastAPI(
@@ -40,6 +60,9 @@ app = FastAPI(
 
 app.include_router(main_router)
 
+# Последний добавленный middleware - внешний: CORS оборачивает и ответы 304 от ConditionalGetMiddleware
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ConditionalGetMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -47,3 +70,4 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
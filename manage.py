@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+import datetime
+
+import database as db
+from config import INGEST_QUEUE_CONCURRENCY
+
+
+async def backfill(args):
+    from parser.backfill import collect_files, collect_archive_files, run_backfill, format_stats
+
+    files = collect_archive_files() if args.from_archive else []
+    files += collect_files(args.sources)
+    if not files:
+        print("Файлы бюллетеней не найдены")
+        return
+
+    await db.init_db()
+    await db.create_table()
+    stats = await run_backfill(files, workers=args.workers)
+    print(format_stats(stats))
+
+
+async def create_schema(args):
+    await db.init_db()
+    await db.create_table()
+    await db.close_db()
+    print("Схема БД создана")
+
+
+async def ingest_worker(args):
+    # Загрузка бюллетеней отдельным процессом: воркеры API (SCHEDULER_IN_API=False)
+    # не импортируют парсер, pandas и aiohttp и быстрее стартуют
+    from cache import init_redis
+    from http_cache import load_data_version
+    from main import app
+    from scheduler import ingestion_scheduler
+
+    await db.init_db()
+    await init_redis()
+    async with db.async_session_maker() as session:
+        await load_data_version(session)
+    try:
+        await ingestion_scheduler(app)
+    finally:
+        await db.close_db()
+
+
+async def queue_redis():
+    from cache import init_redis
+
+    redis = await init_redis()
+    if redis is None:
+        raise SystemExit("Очереди загрузки нужен Redis (TESTING=False)")
+    return redis
+
+
+async def ingest_enqueue(args):
+    from parser.parser import get_ingest_start_date
+    from parser.work_queue import enqueue_bulletins
+
+    await db.init_db()
+    redis = await queue_redis()
+    try:
+        async with db.async_session_maker() as session:
+            if args.rebuild:
+                await db.truncate_table(session)
+                start_date = args.start_date
+            else:
+                start_date = args.start_date or await get_ingest_start_date(session)
+        total = await enqueue_bulletins(redis, start_date, args.max_pages)
+        print(f"В очередь загрузки поставлено бюллетеней: {total}")
+    finally:
+        await db.close_db()
+
+
+async def ingest_queue_worker(args):
+    from parser.work_queue import run_queue_worker
+
+    await db.init_db()
+    redis = await queue_redis()
+    try:
+        processed = await run_queue_worker(redis, args.concurrency, exit_when_done=args.exit_when_done)
+        print(f"Обработано бюллетеней: {processed}")
+    finally:
+        await db.close_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Служебные команды Spimex Trading API")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill_parser = commands.add_parser(
+        "backfill",
+        help="Загрузить в БД бюллетени из локальных XLS-файлов без обращения к spimex.com"
+    )
+    backfill_parser.add_argument("sources", nargs="*", help="Каталоги, glob-шаблоны или пути к XLS-файлам")
+    backfill_parser.add_argument("--from-archive", action="store_true",
+                                 help="Добавить все бюллетени из локального архива (ARCHIVE_PATH)")
+    backfill_parser.add_argument("--workers", type=int, default=None,
+                                 help="Количество процессов разбора (по умолчанию - по числу ядер)")
+    backfill_parser.set_defaults(handler=backfill)
+
+    schema_parser = commands.add_parser("create-schema", help="Создать таблицы и индексы (перед запуском API)")
+    schema_parser.set_defaults(handler=create_schema)
+
+    worker_parser = commands.add_parser(
+        "ingest-worker",
+        help="Загружать новые бюллетени по расписанию отдельно от API (при SCHEDULER_IN_API=False)"
+    )
+    worker_parser.set_defaults(handler=ingest_worker)
+
+    enqueue_parser = commands.add_parser(
+        "ingest-enqueue",
+        help="Поставить ссылки на бюллетени в очередь загрузки Redis для ingest-queue-worker"
+    )
+    enqueue_parser.add_argument("--start-date", type=datetime.date.fromisoformat, default=None,
+                                help="Первая дата торгов (по умолчанию - следующая после последней в БД)")
+    enqueue_parser.add_argument("--rebuild", action="store_true",
+                                help="Очистить таблицы и загрузить все бюллетени с PARSER_START_DATE")
+    enqueue_parser.add_argument("--max-pages", type=int, default=None)
+    enqueue_parser.set_defaults(handler=ingest_enqueue)
+
+    queue_worker_parser = commands.add_parser(
+        "ingest-queue-worker",
+        help="Загружать бюллетени из очереди Redis; можно запускать на нескольких машинах"
+    )
+    queue_worker_parser.add_argument("--concurrency", type=int, default=INGEST_QUEUE_CONCURRENCY,
+                                     help="Бюллетеней одновременно в одном процессе")
+    queue_worker_parser.add_argument("--exit-when-done", action="store_true",
+                                     help="Завершиться после окончания текущего задания")
+    queue_worker_parser.set_defaults(handler=ingest_queue_worker)
+
+    args = parser.parse_args()
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import asyncio
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import distinct, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import database as db
+from config import MEMORY_SNAPSHOT_DAYS, DATA_VERSION_POLL_INTERVAL
+from http_cache import current_version
+
+# Колонки ответа TradingResultResponse и поля, по которым строятся индексы
+FIELDS = [
+    "exchange_product_id", "exchange_product_name", "oil_id", "delivery_basis_id",
+    "delivery_basis_name", "delivery_type_id", "volume", "total", "count", "date",
+]
+INDEXED_FIELDS = ["oil_id", "delivery_basis_id", "delivery_type_id"]
+
+
+class TradingSnapshot:
+    """
+    Последние торговые дни в памяти воркера. Строки упорядочены по дате, поэтому период -
+    это срез по searchsorted в колонке дат, а фильтры - пересечение заранее посчитанных
+    массивов номеров строк. Словари строк ответа собираются один раз при построении.
+    """
+    __slots__ = ("version", "rows", "dates", "indexes")
+
+    def __init__(self, version: Optional[str], rows: List[dict]):
+        rows = sorted(rows, key=lambda row: row["date"])  # sorted устойчива: порядок внутри дня сохраняется
+        self.version = version
+        self.rows = np.empty(len(rows), dtype=object)
+        self.rows[:] = [{field: row[field] for field in FIELDS} for row in rows]
+        self.dates = np.array([row["date"] for row in rows], dtype="datetime64[D]")
+        self.indexes: Dict[str, Dict[str, np.ndarray]] = {}
+        for field in INDEXED_FIELDS:
+            values, inverse = np.unique(np.array([str(row[field]) for row in rows]), return_inverse=True)
+            order = np.argsort(inverse, kind="stable")
+            bounds = np.searchsorted(inverse[order], np.arange(len(values) + 1))
+            self.indexes[field] = {value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(values)}
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def first_date(self) -> Optional[date]:
+        return self.dates[0].item() if len(self) else None
+
+    @property
+    def last_date(self) -> Optional[date]:
+        return self.dates[-1].item() if len(self) else None
+
+    def covers(self, start_date: date) -> bool:
+        """Все строки начиная со start_date есть в снимке (более поздних дней в БД нет)"""
+        return len(self) > 0 and start_date >= self.first_date
+
+    def select(self, start_date: date, end_date: date, oil_id: Optional[str] = None,
+               delivery_type_id: Optional[str] = None, delivery_basis_id: Optional[str] = None) -> List[dict]:
+        low = np.searchsorted(self.dates, np.datetime64(start_date), side="left")
+        high = np.searchsorted(self.dates, np.datetime64(end_date), side="right")
+        positions = None
+        for field, value in (("oil_id", oil_id), ("delivery_type_id", delivery_type_id),
+                             ("delivery_basis_id", delivery_basis_id)):
+            if not value:
+                continue
+            matches = self.indexes[field].get(value)
+            if matches is None:
+                return []
+            # Номера строк в индексе возрастают - сначала срез по периоду, потом пересечение
+            matches = matches[np.searchsorted(matches, low):np.searchsorted(matches, high)]
+            positions = matches if positions is None else np.intersect1d(positions, matches, assume_unique=True)
+
+        if positions is None:
+            return self.rows[low:high].tolist()
+        return self.rows[positions].tolist()
+
+
+_snapshot: Optional[TradingSnapshot] = None
+
+
+def get_snapshot() -> Optional[TradingSnapshot]:
+    """Снимок, если он построен для текущей версии данных; иначе запрос идет в кэш и БД"""
+    if _snapshot is None or _snapshot.version is None or _snapshot.version != current_version():
+        return None
+    return _snapshot
+
+
+async def rebuild_snapshot(session: AsyncSession, days: int = MEMORY_SNAPSHOT_DAYS) -> TradingSnapshot:
+    """Строит снимок последних days торговых дней и подменяет текущий целиком"""
+    global _snapshot
+    version = current_version()
+    table = db.spimex_trading_results
+    result = await session.execute(select(distinct(table.date)).order_by(table.date.desc()).limit(days))
+    last_dates = [row[0] for row in result.all()]
+
+    rows = []
+    if last_dates:
+        result = await session.execute(
+            select(*[getattr(table, field) for field in FIELDS])
+            .where(table.date >= last_dates[-1])
+            .order_by(table.date, table.id)
+        )
+        rows = [dict(row) for row in result.mappings()]
+
+    snapshot = TradingSnapshot(version, rows)
+    _snapshot = snapshot
+    print(f"Снимок в памяти: {len(snapshot)} строк, {snapshot.first_date} - {snapshot.last_date}, версия {version}")
+    return snapshot
+
+
+async def keep_snapshot_fresh():
+    """Фоновая задача: перестраивает снимок, когда меняется версия данных"""
+    while True:
+        if _snapshot is None or _snapshot.version != current_version():
+            try:
+                async with db.async_session_maker() as session:
+                    await rebuild_snapshot(session)
+            except Exception as e:
+                print(f"Не удалось построить снимок в памяти: {e}")
+        await asyncio.sleep(DATA_VERSION_POLL_INTERVAL)
@@ -0,0 +1,162 @@
+import os
+import time
+from typing import Optional, Tuple
+
+from fastapi_cache.types import Backend
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess, REGISTRY
+)
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# http
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса",
+    ["method", "route", "status"]
+)
+
+# cache
+CACHE_REQUESTS = Counter("cache_requests_total", "Обращения к кэшу ответов API", ["result"])
+CACHE_LATENCY = Histogram(
+    "cache_operation_duration_seconds", "Время операции с бэкендом кэша", ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+
+# database
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Ожидание соединения из пула",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Соединения, выданные из пула", multiprocess_mode="livesum")
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "Время выполнения SQL-запроса", ["statement"])
+
+# admission
+ADMISSION_REJECTED = Counter("admission_rejected_total", "Запросы к БД, отклоненные с 429", ["reason"])
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds", "Ожидание слота для тяжелого запроса",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+
+# ingestion
+INGEST_PAGES = Counter("ingest_pages_total", "Просмотренные страницы результатов торгов")
+INGEST_BYTES = Counter("ingest_downloaded_bytes_total", "Скачано байт бюллетеней")
+INGEST_FILES = Counter("ingest_files_total", "Обработанные бюллетени", ["result"])
+INGEST_ROWS = Counter("ingest_rows_total", "Записано строк в spimex_trading_results")
+INGEST_STAGE_SECONDS = Histogram(
+    "ingest_stage_duration_seconds", "Время этапа загрузки", ["stage"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware: гистограмма задержки по шаблону маршрута, а не по фактическому URL"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"], getattr(route, "path", "unmatched"), status
+            ).observe(time.perf_counter() - started)
+
+
+class InstrumentedBackend(Backend):
+    """Обертка над бэкендом fastapi-cache с учетом попаданий, промахов и задержки"""
+
+    def __init__(self, backend: Backend):
+        self.backend = backend
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        started = time.perf_counter()
+        try:
+            ttl, value = await self.backend.get_with_ttl(key)
+        except Exception:
+            CACHE_REQUESTS.labels("error").inc()
+            raise
+        finally:
+            CACHE_LATENCY.labels("get").observe(time.perf_counter() - started)
+        CACHE_REQUESTS.labels("miss" if value is None else "hit").inc()
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with CACHE_LATENCY.labels("get").time():
+            value = await self.backend.get(key)
+        CACHE_REQUESTS.labels("miss" if value is None else "hit").inc()
+        return value
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        with CACHE_LATENCY.labels("set").time():
+            await self.backend.set(key, value, expire)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        with CACHE_LATENCY.labels("clear").time():
+            return await self.backend.clear(namespace, key)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, замеряющий ожидание выдачи соединения"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+
+def instrument_engine(engine: AsyncEngine):
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        statement_type = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        DB_QUERY_DURATION.labels(statement_type).observe(time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def on_error(context):
+        if context.connection is not None and context.connection.info.get("query_started"):
+            context.connection.info["query_started"].pop()
+
+    @event.listens_for(sync_engine.pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(sync_engine.pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.dec()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Метрики в текстовом формате Prometheus; при нескольких воркерах - агрегированные"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
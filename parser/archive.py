@@ -0,0 +1,94 @@
+import datetime
+import hashlib
+import json
+import os
+import shutil
+from typing import Iterator, Optional
+
+from config import ARCHIVE_PATH
+
+# Архив исходных бюллетеней:
+#   objects/<sha[:2]>/<sha256>.xls - содержимое файла, адресуемое по хэшу
+#   urls/<sha1(url)>.json          - метаданные загрузки: url, имя файла, sha256, ETag, Last-Modified
+objects_folder = os.path.join(ARCHIVE_PATH, "objects")
+urls_folder = os.path.join(ARCHIVE_PATH, "urls")
+
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def object_path(sha256: str) -> str:
+    return os.path.join(objects_folder, sha256[:2], f"{sha256}.xls")
+
+
+def _entry_path(url: str) -> str:
+    return os.path.join(urls_folder, f"{hashlib.sha1(url.encode()).hexdigest()}.json")
+
+
+def get_entry(url: str) -> Optional[dict]:
+    try:
+        with open(_entry_path(url), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def conditional_headers(url: str) -> dict:
+    """Заголовки условного запроса для уже заархивированного URL"""
+    entry = get_entry(url)
+    if not entry or not os.path.exists(object_path(entry["sha256"])):
+        return {}
+
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def store(url: str, file_path: str, sha256: str,
+          etag: Optional[str] = None, last_modified: Optional[str] = None) -> str:
+    """Сохраняет скачанный файл в архив и обновляет метаданные URL"""
+    blob = object_path(sha256)
+    if not os.path.exists(blob):
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        shutil.copyfile(file_path, f"{blob}.tmp")
+        os.replace(f"{blob}.tmp", blob)
+
+    entry = {
+        "url": url,
+        "file_name": os.path.basename(file_path),
+        "sha256": sha256,
+        "etag": etag,
+        "last_modified": last_modified,
+        "fetched_on": datetime.datetime.now().isoformat(timespec="seconds")
+    }
+    os.makedirs(urls_folder, exist_ok=True)
+    entry_path = _entry_path(url)
+    with open(f"{entry_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(f"{entry_path}.tmp", entry_path)
+    return sha256
+
+
+def restore(url: str, file_path: str) -> str:
+    """Копирует заархивированный файл URL в file_path (ответ 304 Not Modified)"""
+    entry = get_entry(url)
+    shutil.copyfile(object_path(entry["sha256"]), file_path)
+    return entry["sha256"]
+
+
+def iter_entries() -> Iterator[dict]:
+    if not os.path.isdir(urls_folder):
+        return
+    for name in sorted(os.listdir(urls_folder)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(urls_folder, name), encoding="utf-8") as f:
+            yield json.load(f)
@@ -1,4 +1,7 @@
-from bs4 import BeautifulSoup
+try:
+    from lxml import etree
+except ImportError:  # без lxml остается разбор через BeautifulSoup
+    etree = None
 
 st_accept = "text/html"
 st_useragent = "Mozilla/5.0 (Macintosh; Intel Mac OS X 12_3_1) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15.4 " \
@@ -8,19 +11,43 @@ headers = {
     "User-Agent": st_useragent
 }
 
+xls_link_selector = ".accordeon-inner__item-title.link.xls"
+xls_link_xpath = "//*[@href]" + "".join(
+    f"[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+    for class_name in ("accordeon-inner__item-title", "link", "xls")
+) + "/@href"
+
 
 async def parse(url, session):
     async with session.get(url, headers=headers) as response:
         return await response.text()
 
 
+def extract_xls_links_lxml(html: str) -> list:
+    """Ссылки на бюллетени через libxml2: без построения дерева Python-объектов"""
+    root = etree.HTML(html)
+    if root is None:
+        return []
+    return [str(href) for href in root.xpath(xls_link_xpath)]
+
+
+def extract_xls_links_bs4(html: str) -> list:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    hrefs = soup.select(xls_link_selector)
+    return [ref["href"] for ref in hrefs]
+
+
+def extract_xls_links(html: str) -> list:
+    if etree is not None:
+        return extract_xls_links_lxml(html)
+    return extract_xls_links_bs4(html)
+
+
 async def get_ref(page_id: int, session) -> list:
     html = await parse(
         f"https://spimex.com/markets/oil_products/trades/results/?page=page-{page_id}&bxajaxid"
         "=d609bce6ada86eff0b6f7e49e6bae904", session)
-    soup = BeautifulSoup(html, 'html.parser')
-
-    hrefs = soup.select(".accordeon-inner__item-title.link.xls")
-    trade_dates = [ref["href"] for ref in hrefs]
 
-    return trade_dates
+    return extract_xls_links(html)
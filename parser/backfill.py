@@ -0,0 +1,110 @@
+import asyncio
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+import database as db
+import snapshots
+from sqlalchemy import select
+
+from . import archive
+from .parser import trade_date_from_name, read_bulletin, build_records, save_records
+
+
+def collect_files(sources: Iterable[str]) -> List[Tuple[str, str]]:
+    """Пары (путь к файлу, имя бюллетеня) для каталогов, glob-шаблонов и отдельных файлов"""
+    files = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths = glob.glob(os.path.join(source, "**", "*.xls"), recursive=True)
+        else:
+            paths = glob.glob(source, recursive=True)
+        files.extend((path, os.path.basename(path)) for path in sorted(paths))
+    return files
+
+
+def collect_archive_files() -> List[Tuple[str, str]]:
+    """Пары (путь к объекту архива, исходное имя файла) для всех заархивированных бюллетеней"""
+    return [
+        (archive.object_path(entry["sha256"]), entry["file_name"])
+        for entry in archive.iter_entries()
+    ]
+
+
+def parse_bulletin_file(path: str, file_name: str) -> dict:
+    """Разбирает один бюллетень в отдельном процессе, не удаляя исходный файл"""
+    trade_date = trade_date_from_name(file_name)
+    result = {
+        "file_name": file_name,
+        "date": trade_date,
+        "sha256": None,
+        "size": 0,
+        "records": [],
+        "error": None
+    }
+    try:
+        result["size"] = os.path.getsize(path)
+        result["sha256"] = archive.file_sha256(path)
+        if trade_date is None:
+            raise ValueError(f"Не удалось определить дату торгов по имени файла {file_name}")
+        result["records"] = build_records(read_bulletin(path), trade_date)
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+async def run_backfill(files: List[Tuple[str, str]], workers: Optional[int] = None) -> dict:
+    """Параллельно разбирает бюллетени по процессам и загружает строки в БД по мере готовности"""
+    stats = {"files": len(files), "parsed": 0, "skipped": 0, "failed": 0, "rows": 0, "bytes": 0}
+    started = time.perf_counter()
+
+    async with db.async_session_maker() as session:
+        result = await session.execute(select(db.spimex_ingested_files.sha256))
+        ingested = set(result.scalars().all())
+
+    months = set()
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        tasks = [
+            loop.run_in_executor(executor, parse_bulletin_file, path, file_name)
+            for path, file_name in files
+        ]
+        for task in asyncio.as_completed(tasks):
+            parsed = await task
+            stats["bytes"] += parsed["size"]
+            if parsed["error"]:
+                stats["failed"] += 1
+                print(f"[ backfill ] {parsed['file_name']}: {parsed['error']}")
+                continue
+            if parsed["sha256"] in ingested:
+                stats["skipped"] += 1
+                continue
+
+            async with db.async_session_maker() as session:
+                await save_records(session, parsed["records"], parsed["date"],
+                                   parsed["file_name"], parsed["sha256"])
+            ingested.add(parsed["sha256"])
+            months.add(snapshots.month_start(parsed["date"]))
+            stats["parsed"] += 1
+            stats["rows"] += len(parsed["records"])
+
+    stats["seconds"] = time.perf_counter() - started
+
+    if months:
+        async with db.async_session_maker() as session:
+            await snapshots.rebuild_snapshots(session, months)
+
+    return stats
+
+
+def format_stats(stats: dict) -> str:
+    seconds = stats["seconds"] or 1e-9
+    return (
+        f"files: {stats['files']} (parsed {stats['parsed']}, skipped {stats['skipped']}, failed {stats['failed']})\n"
+        f"rows: {stats['rows']}\n"
+        f"time: {stats['seconds']:.2f} s\n"
+        f"throughput: {stats['parsed'] / seconds:.1f} files/s, {stats['rows'] / seconds:.0f} rows/s, "
+        f"{stats['bytes'] / seconds / 2 ** 20:.2f} MiB/s"
+    )
@@ -3,14 +3,24 @@ import datetime
 import aiohttp
 import os
 import aiofiles
+import hashlib
 import database as db
 import pandas as pd
+import re
+import time
 
+from typing import List, Optional, Tuple
+from sqlalchemy import insert
+from config import PARSER_START_DATE
+from metrics import INGEST_PAGES, INGEST_BYTES, INGEST_FILES, INGEST_ROWS, INGEST_STAGE_SECONDS
+from . import archive
 from .async_pars import get_ref
 from urllib.parse import urlparse
 
 folder_path = "trades_file"
 
+trade_date_pattern = re.compile(r"oil_xls_(\d{8})")
+
 exclude_patterns = [
     "Итого",
     "Секция Биржи: «Нефтепродукты» АО «СПбМТСБ»",
@@ -35,115 +45,236 @@ async def download_xls(url: str) -> str:
     file_name = os.path.basename(parsed_url.path) or "downloaded_file.xls"
     file_path = os.path.join(folder_path, file_name)
 
+    started = time.perf_counter()
     async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
+        async with session.get(url, headers=archive.conditional_headers(url)) as response:
+            if response.status == 304:
+                archive.restore(url, file_path)
+                INGEST_STAGE_SECONDS.labels("download").observe(time.perf_counter() - started)
+                print(f"[  parser  ] The file {file_path[12:]} is not modified, taken from archive")
+                return file_path
+
             response.raise_for_status()  # Проверка на ошибки HTTP
+            digest = hashlib.sha256()
             async with aiofiles.open(file_path, "wb") as f:
                 while True:
                     chunk = await response.content.read(8192)
                     if not chunk:
                         break
+                    digest.update(chunk)
+                    INGEST_BYTES.inc(len(chunk))
                     await f.write(chunk)
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
 
+    archive.store(url, file_path, digest.hexdigest(), etag, last_modified)
+    INGEST_STAGE_SECONDS.labels("download").observe(time.perf_counter() - started)
     print(f"[  parser  ] The file {file_path[12:]} downloaded successfully!")
     return file_path
 
 
 async def get_tables_urls(page: int) -> list:
     trade_ref = []
-    async with aiohttp.ClientSession() as session:
-        ref = await get_ref(page, session)
-        for date in ref:
-            trade_ref.append(date)
+    with INGEST_STAGE_SECONDS.labels("discover").time():
+        async with aiohttp.ClientSession() as session:
+            ref = await get_ref(page, session)
+    INGEST_PAGES.inc()
+    for date in ref:
+        trade_ref.append(date)
 
     return trade_ref
 
 
-async def parse_table(table_name):
-    if int(table_name[20:24]) <= 2023:
-        os.remove(table_name)
-        return False
+def trade_date_from_name(name: str) -> Optional[datetime.date]:
+    """Дата торгов из имени бюллетеня вида oil_xls_YYYYMMDDhhmmss.xls"""
+    match = trade_date_pattern.search(name)
+    if not match:
+        return None
+    try:
+        return datetime.datetime.strptime(match.group(1), "%Y%m%d").date()
+    except ValueError:
+        return None
 
-    date = f"{table_name[26:28]}.{table_name[24:26]}.{table_name[20:24]}"
-    trade_date = datetime.datetime.strptime(date, "%d.%m.%Y")
 
-    try:
-        td = pd.read_excel(table_name, engine="xlrd", skiprows=6, header=None)
+def read_bulletin(table_name: str) -> pd.DataFrame:
+    """Читает XLS-бюллетень и возвращает нормализованные строки с заключенными договорами"""
+    td = pd.read_excel(table_name, engine="xlrd", skiprows=6, header=None)
+
+    header_row = None
+    for i, row in td.iterrows():
+        if any("Код\nИнструмента" in str(cell) for cell in row):
+            header_row = i
+            break
 
-        header_row = None
-        for i, row in td.iterrows():
-            if any("Код\nИнструмента" in str(cell) for cell in row):
-                header_row = i
-                break
+    if header_row is not None:
+        td.columns = td.iloc[header_row]
+        td = td.iloc[header_row + 1:]
+    else:
+        raise ValueError(f"Заголовки не найдены в файле {table_name}")
 
-        if header_row is not None:
-            td.columns = td.iloc[header_row]
-            td = td.iloc[header_row + 1:]
+    for column, new_column in columns_mapping.items():
+        if new_column in ["volume", "total", "count"]:
+            td[column] = td[column].replace('-', '0', regex=True)
+            td[column] = pd.to_numeric(td[column], errors='coerce')
         else:
-            print(f"Заголовки не найдены в файле {table_name}")
-            raise Exception
-
-        for column, new_column in columns_mapping.items():
-            if new_column in ["volume", "total", "count"]:
-                td[column] = td[column].replace('-', '0', regex=True)
-                td[column] = pd.to_numeric(td[column], errors='coerce')
-            else:
-                td[column] = td[column].astype(str).str.strip()
+            td[column] = td[column].astype(str).str.strip()
+
+    return td[td['Количество\nДоговоров,\nшт.'] > 0]
+
+
+def build_records(filtered_td: pd.DataFrame, trade_date) -> List[dict]:
+    """Строки бюллетеня в виде словарей для вставки в spimex_trading_results"""
+    codes = filtered_td['Код\nИнструмента']
+    rows = filtered_td[~(codes.str.startswith("Итого") | (codes == "nan"))]
+    now = datetime.datetime.now()
+
+    return [
+        {
+            "exchange_product_id": exchange_product_id,
+            "exchange_product_name": exchange_product_name,
+            "oil_id": exchange_product_id[:4],
+            "delivery_basis_id": exchange_product_id[4:7],
+            "delivery_basis_name": delivery_basis_name,
+            "delivery_type_id": exchange_product_id[-1],
+            "volume": float(volume),
+            "total": int(total),
+            "count": int(count),
+            "date": trade_date,
+            "created_on": now,
+            "updated_on": now
+        }
+        for exchange_product_id, exchange_product_name, delivery_basis_name, volume, total, count in zip(
+            rows['Код\nИнструмента'],
+            rows['Наименование\nИнструмента'],
+            rows['Базис\nпоставки'],
+            rows['Объем\nДоговоров\nв единицах\nизмерения'],
+            rows['Обьем\nДоговоров,\nруб.'],
+            rows['Количество\nДоговоров,\nшт.']
+        )
+    ]
+
+
+def add_checkpoint(session, checkpoint: Optional[dict]):
+    if checkpoint:
+        session.add(db.spimex_ingest_checkpoints(**checkpoint, processed_on=datetime.datetime.now()))
+
+
+async def save_checkpoint(checkpoint: Optional[dict]):
+    """Отметка о файле, который не загружается в БД, но повторно обрабатывать его не нужно"""
+    if not checkpoint:
+        return
+    async with db.async_session_maker() as session:
+        add_checkpoint(session, checkpoint)
+        await session.commit()
+
+
+async def parse_table(table_name, checkpoint: Optional[dict] = None):
+    trade_date = trade_date_from_name(table_name)
+    if trade_date is None or trade_date < PARSER_START_DATE:
+        os.remove(table_name)
+        INGEST_FILES.labels("outdated").inc()
+        await save_checkpoint(checkpoint)
+        return False
+
+    # Файл с тем же содержимым уже загружен в БД - повторно не разбираем
+    sha256 = archive.file_sha256(table_name)
+    async with db.async_session_maker() as session:
+        if await db.is_file_ingested(session, sha256):
+            os.remove(table_name)
+            print(f"[  parser  ] The file {table_name[12:]} is already ingested, skipped")
+            INGEST_FILES.labels("skipped").inc()
+            add_checkpoint(session, checkpoint)
+            await session.commit()
+            return None
+
+    try:
+        with INGEST_STAGE_SECONDS.labels("parse").time():
+            filtered_td = read_bulletin(table_name)
         os.remove(table_name)
     except Exception as e:
         print(str(e))
         print(f"Ошибка при считывании файла - {table_name}")
         os.remove(table_name)
+        INGEST_FILES.labels("failed").inc()
+        await save_checkpoint(checkpoint)
         return False
 
-    filtered_td = td[td['Количество\nДоговоров,\nшт.'] > 0]
-
     async with db.async_session_maker() as session:
-        await create_and_save_data(session, filtered_td, trade_date, table_name)
-
-
-async def create_and_save_data(session, filtered_td, trade_date, table_name):
-    objects = []
-    for index, row in filtered_td.iterrows():
-        if row['Код\nИнструмента'].startswith("Итого") or row['Код\nИнструмента'] == "nan":
-            continue
-        exchange_product_id = row['Код\nИнструмента']
-        exchange_product_name = row['Наименование\nИнструмента']
-        delivery_basis_name = row['Базис\nпоставки']
-        volume = row['Объем\nДоговоров\nв единицах\nизмерения']
-        total = row['Обьем\nДоговоров,\nруб.']
-        count = row['Количество\nДоговоров,\nшт.']
-
-        trade_obj = db.spimex_trading_results(
-            exchange_product_id=exchange_product_id,
-            exchange_product_name=exchange_product_name,
-            oil_id=exchange_product_id[:4],
-            delivery_basis_id=exchange_product_id[4:7],
-            delivery_basis_name=delivery_basis_name,
-            delivery_type_id=exchange_product_id[-1],
-            volume=float(volume),
-            total=int(total),
-            count=int(count),
-            date=trade_date,
-            created_on=datetime.datetime.now(),
-            updated_on=datetime.datetime.now()
-        )
-        objects.append(trade_obj)
+        await create_and_save_data(session, filtered_td, trade_date, table_name, sha256, checkpoint)
+    INGEST_FILES.labels("ingested").inc()
 
-    if objects:
-        session.add_all(objects)
-        await session.commit()
+
+async def create_and_save_data(session, filtered_td, trade_date, table_name, sha256=None, checkpoint=None):
+    records = build_records(filtered_td, trade_date)
+    await save_records(session, records, trade_date, os.path.basename(table_name), sha256, checkpoint)
     print(f'[ database ] The file {table_name[12:]} saved successfully!')
 
 
-async def run_parser(stopper_threshold=15, max_pages=None):
+async def save_records(session, records: List[dict], trade_date, file_name: str, sha256=None, checkpoint=None):
+    """
+    Записывает строки одного бюллетеня, отметку о его загрузке и контрольную точку запуска
+    одной транзакцией: после сбоя файл либо загружен целиком вместе с отметкой, либо не загружен
+    """
+    add_checkpoint(session, checkpoint)
+    if sha256:
+        session.add(db.spimex_ingested_files(
+            sha256=sha256,
+            file_name=file_name,
+            date=trade_date,
+            ingested_on=datetime.datetime.now()
+        ))
+    with INGEST_STAGE_SECONDS.labels("save").time():
+        if records:
+            await session.execute(insert(db.spimex_trading_results), records)
+        await session.commit()
+    INGEST_ROWS.inc(len(records))
+
+
+def select_wanted_urls(table_urls: List[str], start_date: datetime.date) -> Tuple[List[str], bool]:
+    """
+    Отбирает ссылки не раньше start_date. Ссылки на странице идут по убыванию даты,
+    поэтому первая более ранняя ссылка означает, что дальше листать не нужно.
+    """
+    wanted = []
+    for table_url in table_urls:
+        trade_date = trade_date_from_name(table_url)
+        if trade_date is not None and trade_date < start_date:
+            return wanted, True
+        wanted.append(table_url)
+    return wanted, False
+
+
+async def get_ingest_start_date(session) -> datetime.date:
+    """Первая дата, которой еще нет в БД: следующий день после последней загруженной даты"""
+    last_date = await db.get_last_trading_date(session)
+    if last_date is None:
+        return PARSER_START_DATE
+    return max(last_date + datetime.timedelta(days=1), PARSER_START_DATE)
+
+
+async def run_parser(stopper_threshold=15, max_pages=None, start_date=None, run_id=None):
+    """
+    С run_id каждый обработанный файл отмечается контрольной точкой запуска, а перезапуск
+    продолжает со страницы, на которой запуск остановился, пропуская уже обработанные ссылки
+    """
+    start_date = start_date or PARSER_START_DATE
     stopper = 0
     page = 0
+    processed = set()
+    if run_id is not None:
+        async with db.async_session_maker() as session:
+            page, processed = await db.get_run_progress(session, run_id)
+        if processed:
+            print(f"[  parser  ] Resuming run {run_id} from page {page}, {len(processed)} files already processed")
     while True:
         if max_pages is not None and page >= max_pages:
             break
         print(f'----------------- Downloading page {page} -----------------')
-        table_urls = await get_tables_urls(page)
+        table_urls, reached_start_date = select_wanted_urls(await get_tables_urls(page), start_date)
+        if not table_urls:
+            break
+
+        table_urls = [table_url for table_url in table_urls if table_url not in processed]
 
         tasks_for_downloads = [
             asyncio.create_task(download_xls(f"https://spimex.com/{table_url}"))
@@ -152,14 +283,22 @@ async def run_parser(stopper_threshold=15, max_pages=None):
         table_names = await asyncio.gather(*tasks_for_downloads)
 
         tasks_for_parse = [
-            asyncio.create_task(parse_table(table_name))
-            for table_name in table_names
+            asyncio.create_task(parse_table(
+                table_name,
+                {"run_id": run_id, "url": table_url, "page": page} if run_id is not None else None
+            ))
+            for table_url, table_name in zip(table_urls, table_names)
         ]
         results = await asyncio.gather(*tasks_for_parse)
 
+        if reached_start_date:
+            break
         stopper += results.count(False)
         if stopper >= stopper_threshold:
             break
 
         print('-----------------------------------------------------------\n')
         page += 1
+        if run_id is not None:
+            async with db.async_session_maker() as session:
+                await db.set_run_page(session, run_id, page)
@@ -0,0 +1,279 @@
+import asyncio
+import datetime
+import json
+import time
+from typing import List, Optional
+
+import database as db
+import snapshots
+from cache import invalidate_cache
+from config import INGEST_QUEUE_LEASE, INGEST_QUEUE_MAX_ATTEMPTS, PARSER_START_DATE
+from events import publish_trading_day
+from http_cache import current_version, publish_data_version
+from .parser import download_xls, get_tables_urls, parse_table, select_wanted_urls
+
+# Очередь загрузки в Redis: координатор кладет ссылки на бюллетени в pending, воркеры
+# забирают их BLMOVE в processing и берут аренду (lease) в ZSET со сроком окончания.
+# Подтвержденные ссылки попадают в done, исчерпавшие попытки - в failed. Ссылка с
+# истекшей арендой возвращается в pending, поэтому упавший воркер не теряет работу.
+QUEUE_PREFIX = "spimex:ingest"
+PENDING_KEY = f"{QUEUE_PREFIX}:pending"
+PROCESSING_KEY = f"{QUEUE_PREFIX}:processing"
+LEASES_KEY = f"{QUEUE_PREFIX}:leases"
+DONE_KEY = f"{QUEUE_PREFIX}:done"
+FAILED_KEY = f"{QUEUE_PREFIX}:failed"
+ATTEMPTS_KEY = f"{QUEUE_PREFIX}:attempts"
+TOTAL_KEY = f"{QUEUE_PREFIX}:total"
+SEALED_KEY = f"{QUEUE_PREFIX}:sealed"
+FINISHING_KEY = f"{QUEUE_PREFIX}:finishing"
+COMPLETED_KEY = f"{QUEUE_PREFIX}:completed"
+META_KEY = f"{QUEUE_PREFIX}:meta"
+JOB_KEYS = [PENDING_KEY, PROCESSING_KEY, LEASES_KEY, DONE_KEY, FAILED_KEY, ATTEMPTS_KEY,
+            TOTAL_KEY, SEALED_KEY, FINISHING_KEY, COMPLETED_KEY, META_KEY]
+
+CLAIM_TIMEOUT = 1
+IDLE_DELAY = 0.1
+
+
+def decode(value) -> Optional[str]:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+async def start_job(redis, start_date: datetime.date):
+    """Новое задание: очередь предыдущего задания удаляется"""
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.delete(*JOB_KEYS)
+        pipe.hset(META_KEY, mapping={"start_date": start_date.isoformat(), "started_on": time.time()})
+        await pipe.execute()
+
+
+async def enqueue(redis, urls: List[str]) -> int:
+    """Добавляет ссылки в очередь задания и увеличивает ожидаемое количество ссылок"""
+    if not urls:
+        return 0
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.rpush(PENDING_KEY, *urls)
+        pipe.incrby(TOTAL_KEY, len(urls))
+        await pipe.execute()
+    return len(urls)
+
+
+async def seal(redis) -> bool:
+    """Все ссылки задания в очереди; True, если воркеры уже успели их обработать"""
+    await redis.set(SEALED_KEY, 1)
+    return await try_complete(redis)
+
+
+async def job_state(redis) -> dict:
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.get(TOTAL_KEY)
+        pipe.scard(DONE_KEY)
+        pipe.scard(FAILED_KEY)
+        pipe.llen(PENDING_KEY)
+        pipe.zcard(LEASES_KEY)
+        pipe.exists(SEALED_KEY)
+        pipe.exists(COMPLETED_KEY)
+        total, done, failed, pending, leased, sealed, completed = await pipe.execute()
+    return {
+        "total": int(total or 0),
+        "done": done,
+        "failed": failed,
+        "pending": pending,
+        "leased": leased,
+        "sealed": bool(sealed),
+        "completed": bool(completed),
+    }
+
+
+async def try_complete(redis, lease: float = INGEST_QUEUE_LEASE) -> bool:
+    """
+    Барьер завершения: задание закрыто и каждая ссылка подтверждена или исчерпала попытки.
+    True получает ровно один процесс - он берет аренду на завершение (SET NX EX) и должен
+    вызвать complete_job. Аренда упавшего процесса истекает, и завершение повторяет другой.
+    """
+    state = await job_state(redis)
+    if state["completed"] or not state["sealed"] or state["done"] + state["failed"] < state["total"]:
+        return False
+    return bool(await redis.set(FINISHING_KEY, 1, nx=True, ex=max(int(lease), 1)))
+
+
+async def claim(redis, timeout: float = CLAIM_TIMEOUT, lease: float = INGEST_QUEUE_LEASE) -> Optional[str]:
+    """Забирает ссылку из очереди и берет на нее аренду; None, если очередь пуста"""
+    url = decode(await redis.blmove(PENDING_KEY, PROCESSING_KEY, timeout, "LEFT", "RIGHT"))
+    if url is not None:
+        await redis.zadd(LEASES_KEY, {url: time.time() + lease})
+    return url
+
+
+async def extend_lease(redis, url: str, lease: float = INGEST_QUEUE_LEASE):
+    # XX: аренду, которую уже сняли при возврате ссылки в очередь, не продлеваем
+    await redis.zadd(LEASES_KEY, {url: time.time() + lease}, xx=True)
+
+
+async def ack(redis, url: str) -> bool:
+    """Подтверждает обработку ссылки; True, если это завершило задание"""
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.zrem(LEASES_KEY, url)
+        pipe.lrem(PROCESSING_KEY, 1, url)
+        pipe.sadd(DONE_KEY, url)
+        await pipe.execute()
+    return await try_complete(redis)
+
+
+async def nack(redis, url: str, max_attempts: int = INGEST_QUEUE_MAX_ATTEMPTS) -> bool:
+    """Неудачная попытка: ссылка возвращается в очередь или, после max_attempts, в failed"""
+    attempts = await redis.hincrby(ATTEMPTS_KEY, url, 1)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.zrem(LEASES_KEY, url)
+        pipe.lrem(PROCESSING_KEY, 1, url)
+        if attempts >= max_attempts:
+            pipe.sadd(FAILED_KEY, url)
+        else:
+            pipe.rpush(PENDING_KEY, url)
+        await pipe.execute()
+    return attempts >= max_attempts and await try_complete(redis)
+
+
+async def requeue_expired(redis, lease: float = INGEST_QUEUE_LEASE) -> int:
+    """
+    Возвращает в очередь ссылки с истекшей арендой. Ссылкам в processing без аренды
+    (воркер упал между BLMOVE и ZADD) аренда выдается здесь, и после ее истечения они
+    тоже возвращаются в очередь.
+    """
+    now = time.time()
+    processing = [decode(url) for url in await redis.lrange(PROCESSING_KEY, 0, -1)]
+    if processing:
+        await redis.zadd(LEASES_KEY, {url: now + lease for url in processing}, nx=True)
+
+    requeued = 0
+    for url in await redis.zrangebyscore(LEASES_KEY, "-inf", now):
+        url = decode(url)
+        # ZREM возвращает 1 только одному из воркеров, одновременно разбирающих истекшие аренды
+        if not await redis.zrem(LEASES_KEY, url):
+            continue
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.lrem(PROCESSING_KEY, 1, url)
+            pipe.rpush(PENDING_KEY, url)
+            await pipe.execute()
+        requeued += 1
+    if requeued:
+        print(f"[  queue   ] Requeued {requeued} expired leases")
+    return requeued
+
+
+async def process_url(url: str):
+    """Скачивает и загружает один бюллетень; повторная загрузка того же файла отсекается по SHA-256"""
+    await parse_table(await download_xls(url))
+
+
+async def hold_lease(redis, url: str, lease: float):
+    while True:
+        await asyncio.sleep(lease / 3)
+        await extend_lease(redis, url, lease)
+
+
+async def handle(redis, url: str, lease: float = INGEST_QUEUE_LEASE) -> bool:
+    """Обрабатывает ссылку под арендой; True, если это завершило задание"""
+    if await redis.sismember(DONE_KEY, url):
+        # Ссылку вернули в очередь по истечении аренды, но первый воркер успел ее загрузить
+        return await ack(redis, url)
+    keeper = asyncio.create_task(hold_lease(redis, url, lease))
+    try:
+        await process_url(url)
+    except Exception as e:
+        print(f"[  queue   ] Ошибка загрузки {url}: {str(e)}")
+        return await nack(redis, url)
+    finally:
+        keeper.cancel()
+    return await ack(redis, url)
+
+
+async def finish_job(redis):
+    """Действия после барьера: снимки, сброс кэша и новая версия данных для всех воркеров API"""
+    start_date = decode(await redis.hget(META_KEY, "start_date"))
+    state = await job_state(redis)
+    async with db.async_session_maker() as session:
+        last_date = await db.get_last_trading_date(session)
+        if last_date is not None and start_date:
+            await snapshots.rebuild_snapshots(
+                session, snapshots.months_between(datetime.date.fromisoformat(start_date), last_date)
+            )
+    await invalidate_cache()
+    async with db.async_session_maker() as session:
+        await publish_data_version(session)
+    await publish_trading_day(last_date, current_version())
+    print(f"[  queue   ] Job finished: {json.dumps(state)}")
+
+
+async def complete_job(redis) -> bool:
+    """
+    Завершение задания после барьера. Отметка completed ставится только после успешного
+    finish_job; при ошибке аренда на завершение снимается, и его повторит свободный воркер.
+    """
+    try:
+        await finish_job(redis)
+    except Exception as e:
+        await redis.delete(FINISHING_KEY)
+        print(f"[  queue   ] Ошибка завершения задания: {str(e)}")
+        return False
+    await redis.set(COMPLETED_KEY, 1)
+    await redis.delete(FINISHING_KEY)
+    return True
+
+
+async def run_queue_worker(redis, concurrency: int = 4, lease: float = INGEST_QUEUE_LEASE,
+                           exit_when_done: bool = False) -> int:
+    """
+    Воркер очереди: concurrency ссылок одновременно (скачивание идет параллельно, разбор -
+    по очереди в цикле событий). Возвращает количество обработанных ссылок.
+    """
+    processed = 0
+
+    async def worker():
+        nonlocal processed
+        while True:
+            url = await claim(redis, lease=lease)
+            if url is None:
+                await requeue_expired(redis, lease)
+                # Повтор завершения, если процесс, взявший его, упал или получил ошибку
+                if await try_complete(redis, lease):
+                    await complete_job(redis)
+                if exit_when_done and await redis.exists(COMPLETED_KEY):
+                    return
+                # Отдаем цикл событий остальным задачам, даже если BLMOVE вернулся без ожидания
+                await asyncio.sleep(IDLE_DELAY)
+                continue
+            processed += 1
+            if await handle(redis, url, lease):
+                await complete_job(redis)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return processed
+
+
+async def enqueue_bulletins(redis, start_date: Optional[datetime.date] = None,
+                            max_pages: Optional[int] = None) -> int:
+    """
+    Координатор: листает страницы результатов торгов и кладет ссылки не раньше start_date
+    в очередь постранично - воркеры начинают загрузку, не дожидаясь конца обхода.
+    """
+    start_date = start_date or PARSER_START_DATE
+    await start_job(redis, start_date)
+    total = 0
+    page = 0
+    while max_pages is None or page < max_pages:
+        table_urls, reached_start_date = select_wanted_urls(await get_tables_urls(page), start_date)
+        total += await enqueue(redis, [f"https://spimex.com/{table_url}" for table_url in table_urls])
+        print(f"[  queue   ] Page {page}: enqueued {len(table_urls)} bulletins")
+        if reached_start_date or not table_urls:
+            break
+        page += 1
+
+    if await seal(redis):
+        if total:
+            # Воркеры обработали все ссылки раньше, чем закончился обход страниц
+            await complete_job(redis)
+        else:
+            # Новых бюллетеней нет: снимки, кэш и версия данных не меняются
+            await redis.set(COMPLETED_KEY, 1)
+    return total
@@ -1,7 +1,17 @@
 from routers.refresh import refresh_router
 from routers.trades import trades_router
+from routers.batch import batch_router
+from routers.analytics import analytics_router
+from routers.export import export_router
+from routers.metrics import metrics_router
+from routers.events import events_router
 from fastapi import APIRouter
 
 main_router = APIRouter()
 main_router.include_router(trades_router, tags=["trades"])
+main_router.include_router(batch_router, tags=["trades"])
+main_router.include_router(analytics_router, tags=["trades"])
+main_router.include_router(export_router, tags=["export"])
 main_router.include_router(refresh_router, tags=["update data"])
+main_router.include_router(events_router)
+main_router.include_router(metrics_router)
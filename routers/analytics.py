@@ -0,0 +1,130 @@
+import json
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Optional
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from admission import admit_query, check_rate_limit
+from database import get_read_session, spimex_trading_results
+from http_cache import cache_get, cache_set, versioned_key
+from schemas import AnalyticsResponse
+
+analytics_router = APIRouter(prefix="/api", tags=["trades"])
+
+SERIES_FIELDS = ["volume", "total", "price", "price_ma", "volume_change", "cumulative_volume"]
+
+
+def lookback_start(start_date: date, window: int) -> date:
+    """
+    Начало выборки для окон на первых днях периода: торговых дней не больше, чем календарных,
+    запас - на праздники и выходные
+    """
+    return start_date - timedelta(days=window * 2 + 14)
+
+
+def analytics_query(start_date: date, end_date: date, window: int, oil_id: Optional[str] = None,
+                    delivery_type_id: Optional[str] = None, delivery_basis_id: Optional[str] = None):
+    """
+    Дневные итоги по oil_id и оконные функции Postgres над ними: скользящее среднее цены,
+    изменение объема к предыдущему дню (LAG) и накопленный объем за период
+    """
+    conditions = [
+        spimex_trading_results.date >= lookback_start(start_date, window),
+        spimex_trading_results.date <= end_date
+    ]
+    if oil_id:
+        conditions.append(spimex_trading_results.oil_id == oil_id)
+    if delivery_type_id:
+        conditions.append(spimex_trading_results.delivery_type_id == delivery_type_id)
+    if delivery_basis_id:
+        conditions.append(spimex_trading_results.delivery_basis_id == delivery_basis_id)
+
+    daily = select(
+        spimex_trading_results.oil_id,
+        spimex_trading_results.date,
+        func.sum(spimex_trading_results.volume).label("volume"),
+        func.sum(spimex_trading_results.total).label("total")
+    ).where(and_(*conditions)).group_by(spimex_trading_results.oil_id, spimex_trading_results.date).subquery()
+
+    price = daily.c.total / func.nullif(daily.c.volume, 0)
+    ordered = {"partition_by": daily.c.oil_id, "order_by": daily.c.date}
+    windows = select(
+        daily.c.oil_id,
+        daily.c.date,
+        daily.c.volume,
+        daily.c.total,
+        price.label("price"),
+        func.avg(price).over(**ordered, rows=(-(window - 1), 0)).label("price_ma"),
+        (daily.c.volume - func.lag(daily.c.volume).over(**ordered)).label("volume_change")
+    ).subquery()
+
+    # Накопленный объем считается после отсечения дней до start_date - с начала периода
+    return select(
+        *windows.c,
+        func.sum(windows.c.volume).over(partition_by=windows.c.oil_id, order_by=windows.c.date,
+                                        rows=(None, 0)).label("cumulative_volume")
+    ).where(windows.c.date >= start_date).order_by(windows.c.oil_id, windows.c.date)
+
+
+async def select_analytics(session: AsyncSession, **params) -> dict:
+    query = analytics_query(**params)
+    async with admit_query(session, query):
+        result = await session.execute(query)
+    series = defaultdict(lambda: {"dates": [], **{field: [] for field in SERIES_FIELDS}})
+    for row in result.mappings():
+        columns = series[row["oil_id"]]
+        columns["dates"].append(row["date"].isoformat())
+        for field in SERIES_FIELDS:
+            value = row[field]
+            columns[field].append(int(value) if field == "total" else None if value is None else float(value))
+    return {"window": params["window"], "series": series}
+
+
+@analytics_router.get("/analytics/", response_model=AnalyticsResponse)
+async def get_analytics(
+        request: Request,
+        oil_id: Optional[str] = Query(None, description="Код нефтепродукта (например: A100)"),
+        delivery_type_id: Optional[str] = Query(None, description="Тип поставки (например: E, T)"),
+        delivery_basis_id: Optional[str] = Query(None, description="Базис поставки (например: 000, 001)"),
+        start_date: date = Query(..., description="Начальная дата периода в формате YYYY-MM-DD"),
+        end_date: date = Query(..., description="Конечная дата периода в формате YYYY-MM-DD"),
+        window: int = Query(5, ge=1, le=90, description="Окно скользящего среднего, торговых дней"),
+        session: AsyncSession = Depends(get_read_session)
+):
+    """
+    Рассчитанные ряды по каждому oil_id за период вместо строк get_dynamics: дневные объем и
+    средняя цена (total / volume), скользящее среднее цены за window торговых дней, изменение
+    объема к предыдущему торговому дню и накопленный объем с начала периода.
+
+    Расчет выполняется оконными функциями в Postgres и кэшируется для текущей версии данных.
+    """
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="Начальная дата не может быть больше конечной")
+
+    params = {
+        "oil_id": oil_id, "delivery_type_id": delivery_type_id, "delivery_basis_id": delivery_basis_id,
+        "start_date": start_date, "end_date": end_date, "window": window
+    }
+    cache_key = versioned_key("analytics", urlencode({name: value for name, value in params.items() if value}))
+    cached = await cache_get(cache_key) if cache_key else None
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
+    await check_rate_limit(request)
+    try:
+        analytics = await select_analytics(session, **params)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка при получении данных: {str(e)}")
+    if not analytics["series"]:
+        raise HTTPException(status_code=404, detail="Данные за указанный период не найдены")
+
+    body = json.dumps(analytics, ensure_ascii=False, separators=(",", ":")).encode()
+    if cache_key:
+        await cache_set(cache_key, body)
+    return Response(content=body, media_type="application/json")
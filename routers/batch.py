@@ -0,0 +1,89 @@
+import json
+from typing import Dict, List
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import Integer, and_, func, literal, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from admission import admit_query, check_rate_limit
+from database import get_read_session, spimex_trading_results
+from http_cache import cache_get, cache_set, versioned_key
+from schemas import BatchQuery, BatchRequest, BatchResponse, TradingResultResponse
+
+batch_router = APIRouter(prefix="/api", tags=["trades"])
+
+
+def item_query(index: int, query: BatchQuery):
+    """SELECT одного набора фильтров с номером набора в колонке item"""
+    if query.endpoint == "get_dynamics":
+        conditions = [
+            spimex_trading_results.date >= query.start_date,
+            spimex_trading_results.date <= query.end_date
+        ]
+    else:
+        last_date = select(func.max(spimex_trading_results.date)).scalar_subquery()
+        conditions = [spimex_trading_results.date == last_date]
+
+    if query.oil_id:
+        conditions.append(spimex_trading_results.oil_id == query.oil_id)
+    if query.delivery_type_id:
+        conditions.append(spimex_trading_results.delivery_type_id == query.delivery_type_id)
+    if query.delivery_basis_id:
+        conditions.append(spimex_trading_results.delivery_basis_id == query.delivery_basis_id)
+
+    return select(literal(index, Integer).label("item"), *spimex_trading_results.__table__.columns) \
+        .where(and_(*conditions))
+
+
+async def select_batch(session: AsyncSession, queries: List[BatchQuery]) -> Dict[int, List[dict]]:
+    """Все наборы фильтров одним запросом UNION ALL; строки группируются по номеру набора"""
+    selects = [item_query(index, query) for index, query in enumerate(queries)]
+    statement = selects[0] if len(selects) == 1 else union_all(*selects)
+    async with admit_query(session, statement):
+        result = await session.execute(statement)
+
+    rows = {index: [] for index in range(len(queries))}
+    for row in result.mappings():
+        rows[row["item"]].append(
+            TradingResultResponse.model_validate(row).model_dump(mode="json", by_alias=True)
+        )
+    return rows
+
+
+@batch_router.post("/batch/", response_model=BatchResponse)
+async def batch_query(
+        request: Request,
+        batch: BatchRequest,
+        session: AsyncSession = Depends(get_read_session)
+):
+    """
+    Выполнить несколько запросов get_trading_results и get_dynamics за один вызов.
+
+    Наборы, уже закэшированные для текущей версии данных, берутся из кэша, остальные
+    выполняются одним SQL-запросом. Результаты возвращаются по ключу вида
+    `get_dynamics?oil_id=A592&start_date=...&end_date=...`.
+    """
+    try:
+        queries = {query.key(): query for query in batch.queries}
+        results = {}
+        cache_keys = {key: versioned_key("batch", key) for key in queries}
+
+        for key, cache_key in cache_keys.items():
+            cached = await cache_get(cache_key) if cache_key else None
+            if cached is not None:
+                results[key] = json.loads(cached)
+
+        missing = [key for key in queries if key not in results]
+        if missing:
+            await check_rate_limit(request)
+            rows = await select_batch(session, [queries[key] for key in missing])
+            for index, key in enumerate(missing):
+                results[key] = rows[index]
+                if cache_keys[key]:
+                    await cache_set(cache_keys[key], json.dumps(rows[index], ensure_ascii=False).encode())
+
+        return {"results": {key: results[key] for key in queries}}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка при получении данных: {str(e)}")
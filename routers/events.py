@@ -0,0 +1,29 @@
+from typing import Optional
+
+from fastapi import APIRouter, Header, Query
+from fastapi.responses import StreamingResponse
+
+from events import event_stream, hub
+
+events_router = APIRouter(tags=["events"])
+
+
+@events_router.get("/events/", response_class=StreamingResponse)
+async def trading_day_events(
+        diff: bool = Query(False, description="Передавать вместе с событием результаты торгов нового дня"),
+        last_event_id: Optional[str] = Header(None, description="Версия данных последнего полученного события")
+):
+    """
+    Поток Server-Sent Events: событие `trading_day` приходит, когда загрузка сохранила
+    новый торговый день. Заменяет периодический опрос `/api/get_last_trading_dates/`.
+    """
+    async def stream():
+        with hub.subscribe() as queue:
+            async for chunk in event_stream(queue, diff, last_event_id):
+                yield chunk
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,51 @@
+from datetime import date
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_async_session
+
+export_router = APIRouter(prefix="/api", tags=["export"])
+
+
+@export_router.get("/export/", response_class=StreamingResponse)
+async def export_trading_results(
+        start_date: date = Query(..., description="Начальная дата периода в формате YYYY-MM-DD"),
+        end_date: date = Query(..., description="Конечная дата периода в формате YYYY-MM-DD"),
+        format: Literal["arrow", "parquet"] = Query("arrow", description="Формат выгрузки: arrow (IPC stream) или parquet"),
+        session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Выгрузить торги за период в колоночном формате из помесячных Parquet-снимков.
+
+    Args:
+        start_date: Начальная дата периода
+        end_date: Конечная дата периода
+        format: arrow - Arrow IPC stream, parquet - файл Parquet
+    """
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="Начальная дата не может быть больше конечной")
+
+    import snapshots  # pyarrow загружается при первой выгрузке, а не при старте API
+
+    # Снимки собираются только с основной БД: отставшая реплика записала бы на диск
+    # неполный месяц, который потом отдавался бы до следующей пересборки
+    paths = await snapshots.ensure_snapshots(session, start_date, end_date)
+    if not paths:
+        raise HTTPException(status_code=404, detail="Данные за указанный период не найдены")
+
+    if format == "parquet":
+        stream = snapshots.stream_parquet(paths, start_date, end_date)
+        media_type = snapshots.PARQUET_MEDIA_TYPE
+    else:
+        stream = snapshots.stream_arrow(paths, start_date, end_date)
+        media_type = snapshots.ARROW_MEDIA_TYPE
+
+    file_name = f"spimex_{start_date:%Y%m%d}_{end_date:%Y%m%d}.{format}"
+    return StreamingResponse(
+        stream,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{file_name}"'}
+    )
@@ -1,20 +1,41 @@
 import database as db
-from fastapi import APIRouter
+from cache import invalidate_cache
+from events import publish_trading_day
+from http_cache import current_version, publish_data_version
+from fastapi import APIRouter, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.params import Depends
-from fastapi_cache import FastAPICache
-
-from parser.parser import run_parser
 
 refresh_router = APIRouter()
 
+# Ключ advisory lock в Postgres: обновление выполняет только один запрос во всех воркерах
+REFRESH_LOCK_KEY = 0x53505246
+
 
 @refresh_router.delete("/",
-                       description="Эндпоинт для обновления данных. База данных будет очищена и будет запущен парсер для актуализации данных. Обновление данных в среднем занимает 3-5 минут")
+                       description="Эндпоинт для обновления данных. База данных будет очищена и будет запущен парсер для актуализации данных. Обновление данных в среднем занимает 3-5 минут. Если предыдущее обновление было прервано, оно продолжается с места остановки без очистки базы. Пока обновление выполняется, повторный запрос получает 409")
 async def refresh_data(session: AsyncSession = Depends(db.get_async_session)):
-    await db.truncate_table(session)
-    await run_parser()
+    # Стек парсера (pandas, aiohttp, lxml) и pyarrow загружаются при первом обновлении, а не при старте API
+    import snapshots
+    from parser.parser import run_parser
+
+    async with db.advisory_lock(REFRESH_LOCK_KEY) as locked:
+        if not locked:
+            # Незавершенный запуск под блокировкой - не прерванный, а выполняющийся сейчас
+            raise HTTPException(status_code=409, detail="Обновление данных уже выполняется")
+
+        run = await db.get_unfinished_run(session, "refresh")
+        if run is None:
+            # Таблицы очищаются только при новом запуске; прерванный запуск продолжается с контрольной точки
+            await db.truncate_table(session)
+            run = await db.start_ingest_run(session, "refresh")
+        else:
+            print(f"Продолжение прерванного обновления {run.id} со страницы {run.last_page}")
+        await run_parser(run_id=run.id)
+        await db.finish_ingest_run(session, run.id)
+        await snapshots.rebuild_snapshots(session)
 
-    redis = FastAPICache.get_backend().redis
-    await redis.flushall()
+    await invalidate_cache()
+    last_date = await publish_data_version(session)
+    await publish_trading_day(last_date, current_version())
     return {'msg': 'success'}
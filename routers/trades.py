@@ -1,21 +1,30 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, func, distinct
 from datetime import date
 from typing import Optional, List
 
-from database import get_async_session, spimex_trading_results
+from database import get_read_session, spimex_trading_results
 from schemas import TradingResultResponse, TradingDatesResponse
 from cache import cache_until_1411
+from memory_snapshot import get_snapshot
+from admission import admit_query, check_rate_limit
 
 trades_router = APIRouter(prefix="/api", tags=["trades"])
 
 
+def recent_snapshot(request: Request):
+    """Снимок последних дней в памяти, если клиент не запросил данные в обход кэшей"""
+    if request.headers.get("Cache-Control") in ("no-store", "no-cache"):
+        return None
+    return get_snapshot()
+
+
 @trades_router.get("/get_last_trading_dates/", response_model=TradingDatesResponse)
 @cache_until_1411()
 async def get_last_trading_dates(
         limit: int = Query(7, ge=1, le=100, description="Количество последних торговых дней"),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_read_session)
 ):
     """
     Получить список дат последних торговых дней.
@@ -37,14 +46,14 @@ async def get_last_trading_dates(
 
 
 @trades_router.get("/get_dynamics/", response_model=List[TradingResultResponse])
-@cache_until_1411()
 async def get_dynamics(
+        request: Request,
         oil_id: Optional[str] = Query(None, description="Код нефтепродукта (например: A100)"),
         delivery_type_id: Optional[str] = Query(None, description="Тип поставки (например: E, T)"),
         delivery_basis_id: Optional[str] = Query(None, description="Базис поставки (например: 000, 001)"),
         start_date: date = Query(..., description="Начальная дата периода в формате YYYY-MM-DD"),
         end_date: date = Query(..., description="Конечная дата периода в формате YYYY-MM-DD"),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_read_session)
 ):
     """
     Получить список торгов за заданный период с возможностью фильтрации.
@@ -56,10 +65,35 @@ async def get_dynamics(
         start_date: Начальная дата периода
         end_date: Конечная дата периода
     """
-    try:
-        if start_date > end_date:
-            raise HTTPException(status_code=400, detail="Начальная дата не может быть больше конечной")
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="Начальная дата не может быть больше конечной")
 
+    # Период внутри снимка последних дней отдается из памяти, без Redis и Postgres
+    snapshot = recent_snapshot(request)
+    if snapshot is not None and snapshot.covers(start_date):
+        trades = snapshot.select(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+        if not trades:
+            raise HTTPException(status_code=404, detail="Данные за указанный период не найдены")
+        return trades
+
+    return await cached_dynamics(oil_id=oil_id, delivery_type_id=delivery_type_id,
+                                 delivery_basis_id=delivery_basis_id, start_date=start_date,
+                                 end_date=end_date, request=request, session=session)
+
+
+@cache_until_1411()
+async def cached_dynamics(
+        oil_id: Optional[str],
+        delivery_type_id: Optional[str],
+        delivery_basis_id: Optional[str],
+        start_date: date,
+        end_date: date,
+        request: Request,
+        session: AsyncSession
+):
+    # Сюда доходят только промахи кэша: лимит и оценка стоимости не замедляют ответы из кэша
+    await check_rate_limit(request)
+    try:
         conditions = [
             spimex_trading_results.date >= start_date,
             spimex_trading_results.date <= end_date
@@ -73,8 +107,9 @@ async def get_dynamics(
             conditions.append(spimex_trading_results.delivery_basis_id == delivery_basis_id)
 
         query = select(spimex_trading_results).where(and_(*conditions))
-        result = await session.execute(query)
-        trades = result.scalars().all()
+        async with admit_query(session, query):
+            result = await session.execute(query)
+            trades = result.scalars().all()
 
         if not trades:
             raise HTTPException(status_code=404, detail="Данные за указанный период не найдены")
@@ -87,12 +122,12 @@ async def get_dynamics(
 
 
 @trades_router.get("/get_trading_results/", response_model=List[TradingResultResponse])
-@cache_until_1411()
 async def get_trading_results(
+        request: Request,
         oil_id: Optional[str] = Query(None, description="Код нефтепродукта (например: A100)"),
         delivery_type_id: Optional[str] = Query(None, description="Тип поставки (например: E, T)"),
         delivery_basis_id: Optional[str] = Query(None, description="Базис поставки (например: 000, 001)"),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_read_session)
 ):
     """
     Получить список последних торгов с возможностью фильтрации.
@@ -102,6 +137,29 @@ async def get_trading_results(
         delivery_type_id: Фильтр по типу поставки
         delivery_basis_id: Фильтр по базису поставки
     """
+    # Последний торговый день всегда есть в снимке, если он построен для текущей версии данных
+    snapshot = recent_snapshot(request)
+    if snapshot is not None:
+        if not len(snapshot):
+            raise HTTPException(status_code=404, detail="Данные о торгах не найдены")
+        trades = snapshot.select(snapshot.last_date, snapshot.last_date, oil_id, delivery_type_id, delivery_basis_id)
+        if not trades:
+            raise HTTPException(status_code=404, detail="Данные за последний торговый день не найдены")
+        return trades
+
+    return await cached_trading_results(oil_id=oil_id, delivery_type_id=delivery_type_id,
+                                        delivery_basis_id=delivery_basis_id, request=request, session=session)
+
+
+@cache_until_1411()
+async def cached_trading_results(
+        oil_id: Optional[str],
+        delivery_type_id: Optional[str],
+        delivery_basis_id: Optional[str],
+        request: Request,
+        session: AsyncSession
+):
+    await check_rate_limit(request)
     try:
         max_date_query = select(func.max(spimex_trading_results.date))
         max_date_result = await session.execute(max_date_query)
@@ -0,0 +1,129 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, date, time, timedelta
+
+import httpx
+
+import database as db
+import snapshots
+from cache import invalidate_cache
+from events import publish_trading_day
+from http_cache import current_version, publish_data_version
+from config import SCHEDULER_START_TIME, SCHEDULER_STOP_TIME, SCHEDULER_POLL_INTERVAL
+from parser.parser import get_tables_urls, get_ingest_start_date, run_parser, trade_date_from_name
+
+# Ключ advisory lock в Postgres: загрузку выполняет только один воркер из всех запущенных
+INGEST_LOCK_KEY = 0x53504D58
+
+warm_paths = [
+    "/api/get_last_trading_dates/",
+    "/api/get_trading_results/",
+]
+
+
+def seconds_until(target_time: time) -> float:
+    now = datetime.now()
+    target = datetime.combine(now.date(), target_time)
+    if target <= now:
+        target = datetime.combine(now.date() + timedelta(days=1), target_time)
+    return (target - now).total_seconds()
+
+
+async def warm_cache(app):
+    """
+    Прогревает кэш самыми частыми запросами через ASGI-приложение, минуя сеть. Вызывается
+    сразу после publish_data_version, поэтому запросы читают с основной БД (pin_reads_to_primary)
+    """
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://warmup") as client:
+        for path in warm_paths:
+            response = await client.get(path)
+            print(f"[scheduler] Warmed {path}: {response.status_code}")
+
+
+async def ingest_new_bulletins(app) -> bool:
+    """
+    Загружает бюллетени, вышедшие после последней даты в БД.
+    Возвращает True, если появились новые данные.
+    """
+    async with db.async_session_maker() as session:
+        start_date = await get_ingest_start_date(session)
+
+    # Самая свежая ссылка - первая на первой странице
+    newest = [trade_date_from_name(url) for url in await get_tables_urls(0)]
+    newest = [trade_date for trade_date in newest if trade_date is not None]
+    if not newest or max(newest) < start_date:
+        return False
+
+    await run_parser(start_date=start_date)
+
+    async with db.async_session_maker() as session:
+        last_date = await db.get_last_trading_date(session)
+        if last_date is None or last_date < start_date:
+            return False
+        await snapshots.rebuild_snapshots(session, snapshots.months_between(start_date, last_date))
+
+    await invalidate_cache()
+    async with db.async_session_maker() as session:
+        await publish_data_version(session)
+    await warm_cache(app)
+    await publish_trading_day(last_date, current_version())
+    print(f"[scheduler] Ingested trading days {start_date} - {last_date}")
+    return True
+
+
+@asynccontextmanager
+async def ingest_leadership():
+    """
+    Выбор ведущего воркера через session-level advisory lock в Postgres.
+    Блокировка держится на выделенном соединении все окно опроса и снимается
+    сервером автоматически, если воркер упадет.
+    """
+    async with db.advisory_lock(INGEST_LOCK_KEY) as locked:
+        yield locked
+
+
+async def is_today_ingested() -> bool:
+    async with db.async_session_maker() as session:
+        last_date = await db.get_last_trading_date(session)
+    return last_date is not None and last_date >= date.today()
+
+
+async def lead_polling(app) -> bool:
+    """Опрашивает сайт до появления бюллетеня за сегодня или до конца окна публикации"""
+    while datetime.now().time() < SCHEDULER_STOP_TIME:
+        if await is_today_ingested():
+            return True
+        try:
+            if await ingest_new_bulletins(app):
+                return True
+        except Exception as e:
+            print(f"[scheduler] Ошибка загрузки: {str(e)}")
+        await asyncio.sleep(SCHEDULER_POLL_INTERVAL)
+    return False
+
+
+async def poll_for_bulletin(app) -> bool:
+    """Остальные воркеры ждут и перехватывают опрос, если ведущий перестал его выполнять"""
+    while datetime.now().time() < SCHEDULER_STOP_TIME:
+        if await is_today_ingested():
+            return True
+        async with ingest_leadership() as leader:
+            if leader:
+                return await lead_polling(app)
+        await asyncio.sleep(SCHEDULER_POLL_INTERVAL)
+    return False
+
+
+async def ingestion_scheduler(app):
+    """Фоновая задача: ежедневно ждет окно публикации бюллетеня и загружает его"""
+    while True:
+        now = datetime.now().time()
+        if not SCHEDULER_START_TIME <= now < SCHEDULER_STOP_TIME:
+            await asyncio.sleep(seconds_until(SCHEDULER_START_TIME))
+        try:
+            found = await poll_for_bulletin(app)
+            print(f"[scheduler] Polling window finished, new bulletin: {found}")
+        except Exception as e:
+            print(f"[scheduler] Ошибка планировщика: {str(e)}")
+        await asyncio.sleep(seconds_until(SCHEDULER_START_TIME))
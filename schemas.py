@@ -1,6 +1,7 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from datetime import date, datetime
-from typing import Optional, List
+from typing import Dict, Literal, Optional, List
+from urllib.parse import urlencode
 
 
 class TradingResultResponse(BaseModel):
@@ -37,3 +38,55 @@ class TradingResultsFilters(BaseModel):
     oil_id: Optional[str] = Field(None, description="Код нефтепродукта")
     delivery_type_id: Optional[str] = Field(None, description="Тип поставки")
     delivery_basis_id: Optional[str] = Field(None, description="Базис поставки")
+
+
+class BatchQuery(BaseModel):
+    endpoint: Literal["get_trading_results", "get_dynamics"] = Field(
+        ..., description="Эндпоинт, параметры которого повторяет запрос"
+    )
+    oil_id: Optional[str] = Field(None, description="Код нефтепродукта")
+    delivery_type_id: Optional[str] = Field(None, description="Тип поставки")
+    delivery_basis_id: Optional[str] = Field(None, description="Базис поставки")
+    start_date: Optional[date] = Field(None, description="Начальная дата периода (только для get_dynamics)")
+    end_date: Optional[date] = Field(None, description="Конечная дата периода (только для get_dynamics)")
+
+    @model_validator(mode="after")
+    def check_period(self):
+        if self.endpoint == "get_dynamics":
+            if self.start_date is None or self.end_date is None:
+                raise ValueError("Для get_dynamics нужны start_date и end_date")
+            if self.start_date > self.end_date:
+                raise ValueError("Начальная дата не может быть больше конечной")
+        elif self.start_date is not None or self.end_date is not None:
+            raise ValueError("get_trading_results возвращает последний торговый день и не принимает период")
+        return self
+
+    def key(self) -> str:
+        """Ключ результата в ответе: эндпоинт и заданные фильтры в виде строки запроса"""
+        params = self.model_dump(exclude={"endpoint"}, exclude_none=True, mode="json")
+        return f"{self.endpoint}?{urlencode(params)}" if params else self.endpoint
+
+
+class BatchRequest(BaseModel):
+    queries: List[BatchQuery] = Field(..., min_length=1, max_length=50, description="Наборы фильтров")
+
+
+class BatchResponse(BaseModel):
+    results: Dict[str, List[TradingResultResponse]] = Field(
+        ..., description="Результаты по ключу запроса; пустой список, если данных нет"
+    )
+
+
+class AnalyticsSeries(BaseModel):
+    dates: List[date] = Field(..., description="Торговые дни периода")
+    volume: List[float] = Field(..., description="Объем договоров за день в единицах измерения")
+    total: List[int] = Field(..., description="Объем договоров за день, руб.")
+    price: List[Optional[float]] = Field(..., description="Средняя цена за день (total / volume)")
+    price_ma: List[Optional[float]] = Field(..., description="Скользящее среднее цены за window торговых дней")
+    volume_change: List[Optional[float]] = Field(..., description="Изменение объема к предыдущему торговому дню")
+    cumulative_volume: List[float] = Field(..., description="Накопленный объем с начала периода")
+
+
+class AnalyticsResponse(BaseModel):
+    window: int = Field(..., description="Окно скользящего среднего, торговых дней")
+    series: Dict[str, AnalyticsSeries] = Field(..., description="Ряды по коду нефтепродукта")
@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from collections import defaultdict
+from datetime import date
+from typing import Iterable, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import select, func, distinct, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import SNAPSHOT_PATH
+from database import spimex_trading_results
+
+SNAPSHOT_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("exchange_product_id", pa.string()),
+    ("exchange_product_name", pa.string()),
+    ("oil_id", pa.string()),
+    ("delivery_basis_id", pa.string()),
+    ("delivery_basis_name", pa.string()),
+    ("delivery_type_id", pa.string()),
+    ("volume", pa.float64()),
+    ("total", pa.int64()),
+    ("count", pa.int64()),
+    ("date", pa.date32()),
+])
+
+SNAPSHOT_COLUMNS = SNAPSHOT_SCHEMA.names
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+# Сборка снимка месяца в процессе идет под блокировкой месяца: выгрузка не собирает заново
+# месяц, который уже пересобирается, и не перезаписывает свежий снимок данными, прочитанными раньше
+_month_locks = defaultdict(asyncio.Lock)
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(day: date) -> date:
+    if day.month == 12:
+        return date(day.year + 1, 1, 1)
+    return date(day.year, day.month + 1, 1)
+
+
+def months_between(start_date: date, end_date: date) -> List[date]:
+    months = []
+    month = month_start(start_date)
+    while month <= end_date:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def snapshot_file(month: date) -> str:
+    return os.path.join(SNAPSHOT_PATH, f"spimex_{month:%Y_%m}.parquet")
+
+
+def rows_checksum(rows: Iterable[tuple]) -> str:
+    """SHA-256 по строкам в порядке SNAPSHOT_COLUMNS, отсортированным по id"""
+    digest = hashlib.sha256()
+    for row in sorted(rows, key=lambda r: r[0]):
+        digest.update(repr(tuple(row)).encode())
+    return digest.hexdigest()
+
+
+def table_checksum(table: pa.Table) -> str:
+    columns = [table.column(name).to_pylist() for name in SNAPSHOT_COLUMNS]
+    return rows_checksum(zip(*columns))
+
+
+async def fetch_month_table(session: AsyncSession, month: date) -> pa.Table:
+    """Выгружает нормализованные строки за месяц из БД в Arrow-таблицу"""
+    query = select(*(getattr(spimex_trading_results, name) for name in SNAPSHOT_COLUMNS)) \
+        .where(and_(spimex_trading_results.date >= month,
+                    spimex_trading_results.date < next_month(month))) \
+        .order_by(spimex_trading_results.id)
+    result = await session.execute(query)
+    rows = result.all()
+    columns = list(zip(*rows)) if rows else [[] for _ in SNAPSHOT_COLUMNS]
+    return pa.Table.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, SNAPSHOT_SCHEMA)],
+        schema=SNAPSHOT_SCHEMA
+    )
+
+
+def write_snapshot(table: pa.Table, month: date) -> str:
+    os.makedirs(SNAPSHOT_PATH, exist_ok=True)
+    path = snapshot_file(month)
+    # Уникальный временный файл в том же каталоге: одновременные записи (другие воркеры и
+    # процессы загрузки) не пишут в один файл, а os.replace подменяет снимок атомарно
+    with tempfile.NamedTemporaryFile(dir=SNAPSHOT_PATH, prefix=f"{os.path.basename(path)}.",
+                                     suffix=".tmp", delete=False) as tmp:
+        tmp_path = tmp.name
+    try:
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return path
+
+
+async def get_trading_months(session: AsyncSession) -> List[date]:
+    query = select(distinct(func.date_trunc("month", spimex_trading_results.date)))
+    result = await session.execute(query)
+    return sorted(row[0].date() for row in result.all())
+
+
+async def rebuild_snapshots(session: AsyncSession, months: Optional[Iterable[date]] = None) -> int:
+    """Пересобирает помесячные Parquet-снимки (по умолчанию - за все месяцы в БД)"""
+    if months is None:
+        months = await get_trading_months(session)
+    count = 0
+    for month in sorted({month_start(month) for month in months}):
+        async with _month_locks[month]:
+            table = await fetch_month_table(session, month)
+            await asyncio.to_thread(write_snapshot, table, month)
+        count += 1
+    print(f"[ snapshot ] Rebuilt {count} monthly snapshots")
+    return count
+
+
+async def ensure_snapshots(session: AsyncSession, start_date: date, end_date: date) -> List[str]:
+    """Возвращает пути снимков за период, собирая отсутствующие месяцы из БД"""
+    paths = []
+    for month in months_between(start_date, end_date):
+        path = snapshot_file(month)
+        if not os.path.exists(path):
+            async with _month_locks[month]:
+                # Пока ждали блокировку, месяц мог собрать другой запрос
+                if not os.path.exists(path):
+                    table = await fetch_month_table(session, month)
+                    if table.num_rows == 0:
+                        continue
+                    await asyncio.to_thread(write_snapshot, table, month)
+        paths.append(path)
+    return paths
+
+
+def read_snapshot(path: str, start_date: date, end_date: date) -> pa.Table:
+    return pq.read_table(path, filters=[("date", ">=", start_date), ("date", "<=", end_date)])
+
+
+def read_range(paths: List[str], start_date: date, end_date: date) -> pa.Table:
+    tables = [read_snapshot(path, start_date, end_date) for path in paths]
+    if not tables:
+        return SNAPSHOT_SCHEMA.empty_table()
+    return pa.concat_tables(tables)
+
+
+class _ChunkSink:
+    """Файлоподобный приемник, из которого поток забирает готовые куски"""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_arrow(paths: List[str], start_date: date, end_date: date) -> Iterator[bytes]:
+    """Arrow IPC stream: по одному набору батчей на месячный снимок"""
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), SNAPSHOT_SCHEMA)
+    for path in paths:
+        writer.write_table(read_snapshot(path, start_date, end_date))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def stream_parquet(paths: List[str], start_date: date, end_date: date) -> Iterator[bytes]:
+    """Parquet-файл, в котором каждый месяц - отдельная row group"""
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), SNAPSHOT_SCHEMA)
+    for path in paths:
+        writer.write_table(read_snapshot(path, start_date, end_date))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
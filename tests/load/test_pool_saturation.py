@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from conftest import TEST_DATABASE_URL
+from database import build_engine, get_read_session
+from main import app
+
+
+@pytest.mark.asyncio
+async def test_pool_queues_requests_over_capacity():
+    engine = build_engine(TEST_DATABASE_URL, pool_size=2, max_overflow=0, pool_timeout=10)
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    peak = 0
+
+    async def query():
+        nonlocal peak
+        async with session_maker() as session:
+            await session.execute(text("SELECT pg_sleep(0.05)"))
+            peak = max(peak, engine.pool.checkedout())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(query() for _ in range(20)))
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+
+    assert peak == 2
+    # 20 запросов по 50 мс через 2 соединения - не меньше 10 волн
+    assert elapsed >= 0.5
+
+
+@pytest.mark.asyncio
+async def test_pool_timeout_under_saturation():
+    engine = build_engine(TEST_DATABASE_URL, pool_size=1, max_overflow=0, pool_timeout=0.1)
+
+    async def hold_connection():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT pg_sleep(0.5)"))
+
+    holder = asyncio.create_task(hold_connection())
+    await asyncio.sleep(0.1)
+    with pytest.raises(PoolTimeoutError):
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    await holder
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_uncached_requests(setup_test_data, mocker):
+    # Лимит запросов проверяется в test_admission; здесь Redis тестового окружения недоступен
+    mocker.patch('admission.get_redis', return_value=None)
+    engine = build_engine(TEST_DATABASE_URL, pool_size=3, max_overflow=2, pool_timeout=10)
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    peak = 0
+
+    async def pooled_session():
+        nonlocal peak
+        async with session_maker() as session:
+            yield session
+            peak = max(peak, engine.pool.checkedout())
+
+    app.dependency_overrides[get_read_session] = pooled_session
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        responses = await asyncio.gather(*(
+            client.get("/api/get_trading_results/", headers={"Cache-Control": "no-store"})
+            for _ in range(50)
+        ))
+    await engine.dispose()
+
+    assert [response.status_code for response in responses] == [200] * 50
+    assert all(response.json()[0]["date"] == "2023-01-02" for response in responses)
+    assert peak <= 5
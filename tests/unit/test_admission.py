@@ -0,0 +1,161 @@
+import asyncio
+from datetime import date
+
+import fakeredis
+import httpx
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, text
+from starlette.requests import Request
+
+import admission
+from admission import admit_query, check_rate_limit, estimate_rows, plan_rows
+from database import spimex_trading_results
+from main import app
+from routers.analytics import analytics_query
+
+
+def make_request(host="10.0.0.1"):
+    return Request({"type": "http", "method": "GET", "path": "/api/get_dynamics/", "headers": [],
+                    "client": (host, 50000)})
+
+
+@pytest.fixture
+def redis(mocker):
+    redis = fakeredis.FakeAsyncRedis()
+    mocker.patch('admission.get_redis', return_value=redis)
+    return redis
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_per_client(redis):
+    for _ in range(2):
+        await check_rate_limit(make_request(), limit=2, window=60)
+
+    with pytest.raises(HTTPException) as exc:
+        await check_rate_limit(make_request(), limit=2, window=60)
+    assert exc.value.status_code == 429
+    assert 1 <= int(exc.value.headers["Retry-After"]) <= 61
+
+    # Лимит у каждого клиента свой
+    await check_rate_limit(make_request("10.0.0.2"), limit=2, window=60)
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_skipped_after_redis_error(mocker):
+    redis = mocker.MagicMock()
+    redis.pipeline.side_effect = ConnectionError("redis is down")
+    mocker.patch('admission.get_redis', return_value=redis)
+    mocker.patch('admission._redis_retry_at', 0.0)
+
+    await check_rate_limit(make_request(), limit=1, window=60)
+    await check_rate_limit(make_request(), limit=1, window=60)
+    assert redis.pipeline.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_estimate_rows_uses_planner(test_session, setup_test_data):
+    query = select(spimex_trading_results).where(spimex_trading_results.oil_id == "A100")
+
+    assert await estimate_rows(test_session, query) >= 1
+
+    # Значения передаются параметрами: двоеточие и кавычка в литерале не ломают EXPLAIN
+    query = select(spimex_trading_results).where(spimex_trading_results.oil_id == "a:b ' x")
+    assert await estimate_rows(test_session, query) >= 0
+
+
+@pytest.mark.asyncio
+async def test_aggregate_estimate_counts_scanned_rows(test_session):
+    await test_session.execute(text(
+        "INSERT INTO spimex_trading_results (oil_id, delivery_type_id, delivery_basis_id, volume, total, date) "
+        "SELECT 'A' || (i % 50), 'F', '000', 1, 100, DATE '2022-01-01' + i % 730 FROM generate_series(1, 60000) i"
+    ))
+    await test_session.execute(text("ANALYZE spimex_trading_results"))
+
+    analytics = analytics_query(start_date=date(2022, 1, 1), end_date=date(2023, 12, 31), window=5)
+    try:
+        # Групп по oil_id и дню меньше, чем прочитанных строк; оценка - по прочитанным
+        assert await estimate_rows(test_session, analytics) >= 50000
+    finally:
+        await test_session.rollback()
+
+
+def test_plan_rows_scales_parallel_scans():
+    plan = {"Node Type": "Gather", "Plan Rows": 100, "Workers Planned": 2, "Plans": [
+        {"Node Type": "Aggregate", "Plan Rows": 100, "Plans": [
+            {"Node Type": "Seq Scan", "Plan Rows": 1000, "Parallel Aware": True}
+        ]}
+    ]}
+
+    assert plan_rows(plan) == 3000
+
+
+@pytest.mark.asyncio
+async def test_expensive_queries_are_capped(mocker):
+    mocker.patch('admission._expensive', asyncio.Semaphore(1))
+    mocker.patch('admission.estimate_rows', side_effect=lambda session, query: query)
+    session = mocker.AsyncMock()
+
+    async with admit_query(session, 10 ** 6, expensive_rows=1000, timeout=0.05):
+        # Тяжелый запрос отдает соединение в пул до ожидания слота
+        session.close.assert_awaited_once()
+        with pytest.raises(HTTPException) as exc:
+            async with admit_query(session, 10 ** 6, expensive_rows=1000, timeout=0.05):
+                pass
+        assert exc.value.status_code == 429
+        assert exc.value.headers["Retry-After"] == "1"
+
+        # Легкий запрос не ждет слот, пока тяжелые заняли все, и сохраняет соединение
+        session.close.reset_mock()
+        async with admit_query(session, 10, expensive_rows=1000, timeout=0.05):
+            pass
+        session.close.assert_not_awaited()
+
+    async with admit_query(session, 10 ** 6, expensive_rows=1000, timeout=0.05):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_unknown_estimate_is_expensive(mocker):
+    mocker.patch('admission._expensive', asyncio.Semaphore(0))
+    mocker.patch('admission.estimate_rows', side_effect=RuntimeError("EXPLAIN failed"))
+
+    with pytest.raises(HTTPException) as exc:
+        async with admit_query(mocker.AsyncMock(), None, expensive_rows=1000, timeout=0.05):
+            pass
+    assert exc.value.status_code == 429
+
+
+@pytest.mark.asyncio
+async def test_get_dynamics_sheds_expensive_query(setup_test_data, mocker):
+    mocker.patch('admission.get_redis', return_value=None)
+    mocker.patch('admission._expensive', asyncio.Semaphore(0))
+    mocker.patch('admission.ADMISSION_QUEUE_TIMEOUT', 0.05)
+    mocker.patch('admission.estimate_rows', return_value=10 ** 7)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        shed = await client.get("/api/get_dynamics/", params={"start_date": "2000-01-01", "end_date": "2023-12-31"},
+                                headers={"Cache-Control": "no-store"})
+        dates = await client.get("/api/get_last_trading_dates/")
+
+    assert shed.status_code == 429
+    assert "Retry-After" in shed.headers
+    assert dates.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_batch_and_analytics_shed_expensive_queries(setup_test_data, mocker):
+    mocker.patch('admission.get_redis', return_value=None)
+    mocker.patch('admission._expensive', asyncio.Semaphore(0))
+    mocker.patch('admission.ADMISSION_QUEUE_TIMEOUT', 0.05)
+    mocker.patch('admission.estimate_rows', return_value=10 ** 7)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        batch = await client.post("/api/batch/", json={"queries": [
+            {"endpoint": "get_dynamics", "start_date": "2000-01-01", "end_date": "2023-12-31"}
+        ]})
+        analytics = await client.get("/api/analytics/", params={"start_date": "2000-01-01", "end_date": "2023-12-31"})
+
+    assert batch.status_code == 429
+    assert analytics.status_code == 429
+    assert "Retry-After" in analytics.headers
@@ -0,0 +1,96 @@
+from datetime import date, datetime
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from sqlalchemy import text
+
+from database import spimex_trading_results
+from http_cache import set_data_version
+from main import app
+
+# A592: четыре торговых дня, 2023-01-03 - два договора по разным базисам
+SERIES = [
+    ("A592ANK060F", date(2023, 1, 2), 100.0, 5000000),
+    ("A592ANK060F", date(2023, 1, 3), 100.0, 5200000),
+    ("A592UFM060F", date(2023, 1, 3), 100.0, 5400000),
+    ("A592ANK060F", date(2023, 1, 4), 50.0, 2750000),
+    ("A592ANK060F", date(2023, 1, 5), 150.0, 8400000),
+    ("DTZ0KRS060F", date(2023, 1, 5), 10.0, 700000),
+]
+
+
+@pytest.fixture(autouse=True)
+def cache_backend(mocker):
+    mocker.patch('http_cache._version', None)
+    mocker.patch.object(FastAPICache, '_backend', InMemoryBackend())
+
+
+@pytest_asyncio.fixture
+async def trades(test_session):
+    test_session.add_all([
+        spimex_trading_results(
+            exchange_product_id=product_id, exchange_product_name=product_id, oil_id=product_id[:4],
+            delivery_basis_id=product_id[4:7], delivery_basis_name=product_id[4:7],
+            delivery_type_id=product_id[-1], volume=volume, total=total, count=1, date=trade_date,
+            created_on=datetime.now(), updated_on=datetime.now()
+        )
+        for product_id, trade_date, volume, total in SERIES
+    ])
+    await test_session.commit()
+    yield
+    await test_session.execute(text("TRUNCATE TABLE spimex_trading_results RESTART IDENTITY CASCADE"))
+    await test_session.commit()
+
+
+async def get_analytics(**params):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get("/api/analytics/", params=params)
+
+
+@pytest.mark.asyncio
+async def test_analytics_series(trades):
+    response = await get_analytics(start_date="2023-01-03", end_date="2023-01-05", window=2)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["window"] == 2
+    assert list(body["series"]) == ["A592", "DTZ0"]
+
+    a592 = body["series"]["A592"]
+    assert a592["dates"] == ["2023-01-03", "2023-01-04", "2023-01-05"]
+    assert a592["volume"] == [200.0, 50.0, 150.0]
+    assert a592["price"] == [53000.0, 55000.0, 56000.0]
+    # Окно и LAG на первом дне периода учитывают 2023-01-02 за его пределами
+    assert a592["price_ma"] == [51500.0, 54000.0, 55500.0]
+    assert a592["volume_change"] == [100.0, -150.0, 100.0]
+    assert a592["cumulative_volume"] == [200.0, 250.0, 400.0]
+
+    assert body["series"]["DTZ0"]["volume_change"] == [None]
+
+
+@pytest.mark.asyncio
+async def test_analytics_filters_and_errors(trades):
+    filtered = await get_analytics(oil_id="DTZ0", start_date="2023-01-01", end_date="2023-01-31")
+    empty = await get_analytics(oil_id="A100", start_date="2023-01-01", end_date="2023-01-31")
+    reversed_period = await get_analytics(start_date="2023-01-05", end_date="2023-01-01")
+
+    assert list(filtered.json()["series"]) == ["DTZ0"]
+    assert empty.status_code == 404
+    assert reversed_period.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_analytics_cached_per_data_version(trades, test_session, mocker):
+    set_data_version(date(2023, 1, 5), 1)
+    first = await get_analytics(start_date="2023-01-02", end_date="2023-01-05")
+    execute = mocker.spy(test_session, "execute")
+
+    assert (await get_analytics(start_date="2023-01-02", end_date="2023-01-05")).json() == first.json()
+    assert execute.call_count == 0
+
+    set_data_version(date(2023, 1, 5), 2)
+    await get_analytics(start_date="2023-01-02", end_date="2023-01-05")
+    assert execute.call_count == 1
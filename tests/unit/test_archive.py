@@ -0,0 +1,79 @@
+import hashlib
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from unittest.mock import AsyncMock, MagicMock
+
+from parser import archive
+from parser.parser import download_xls, parse_table
+
+
+@pytest.fixture
+def archive_dir(tmp_path, mocker):
+    mocker.patch('parser.archive.objects_folder', str(tmp_path / "archive" / "objects"))
+    mocker.patch('parser.archive.urls_folder', str(tmp_path / "archive" / "urls"))
+    mocker.patch('parser.parser.folder_path', str(tmp_path / "trades_file"))
+    return tmp_path
+
+
+def test_store_and_restore(archive_dir):
+    source = archive_dir / "oil_xls_20240105162000.xls"
+    source.write_bytes(b"bulletin")
+    sha256 = hashlib.sha256(b"bulletin").hexdigest()
+
+    archive.store("https://spimex.com/a.xls", str(source), sha256, '"etag-1"', "Fri, 05 Jan 2024 16:20:00 GMT")
+
+    assert archive.conditional_headers("https://spimex.com/a.xls") == {
+        "If-None-Match": '"etag-1"',
+        "If-Modified-Since": "Fri, 05 Jan 2024 16:20:00 GMT"
+    }
+    assert archive.conditional_headers("https://spimex.com/b.xls") == {}
+
+    target = archive_dir / "restored.xls"
+    assert archive.restore("https://spimex.com/a.xls", str(target)) == sha256
+    assert target.read_bytes() == b"bulletin"
+    assert [entry["file_name"] for entry in archive.iter_entries()] == ["oil_xls_20240105162000.xls"]
+
+
+@pytest.mark.asyncio
+async def test_download_xls_sends_conditional_request(archive_dir):
+    requests = []
+
+    async def handler(request):
+        requests.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(body=b"bulletin", headers={"ETag": '"v1"'})
+
+    app = web.Application()
+    app.router.add_get("/oil_xls_20240105162000.xls", handler)
+    async with TestServer(app) as server:
+        url = str(server.make_url("/oil_xls_20240105162000.xls"))
+        first = await download_xls(url)
+        (archive_dir / "trades_file" / "oil_xls_20240105162000.xls").unlink()
+        second = await download_xls(url)
+
+    assert requests == [None, '"v1"']
+    assert first == second
+    with open(second, "rb") as f:
+        assert f.read() == b"bulletin"
+
+
+@pytest.mark.asyncio
+async def test_parse_table_skips_ingested_file(mocker):
+    session_maker = MagicMock()
+    session_maker.return_value.__aenter__ = AsyncMock()
+    session_maker.return_value.__aexit__ = AsyncMock(return_value=False)
+    mocker.patch('parser.parser.db.async_session_maker', session_maker)
+    mocker.patch('parser.parser.db.is_file_ingested', return_value=True)
+    mocker.patch('parser.parser.archive.file_sha256', return_value="0" * 64)
+    mock_read_excel = mocker.patch('parser.parser.pd.read_excel')
+    mock_save = mocker.patch('parser.parser.create_and_save_data')
+    mock_remove = mocker.patch('parser.parser.os.remove')
+
+    result = await parse_table('trades_file/oil_xls_20240105162000.xls')
+
+    assert result is None
+    mock_read_excel.assert_not_called()
+    mock_save.assert_not_called()
+    mock_remove.assert_called_once_with('trades_file/oil_xls_20240105162000.xls')
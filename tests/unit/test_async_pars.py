@@ -71,3 +71,49 @@ async def test_parse_headers():
     assert headers["Accept"] == "text/html"
     assert "User-Agent" in headers
     assert "Mozilla" in headers["User-Agent"]
+
+
+RESULTS_PAGE = """
+<div class="accordeon-inner">
+    <div class="accordeon-inner__item">
+        <a class="accordeon-inner__item-title link xls" href="/upload/reports/oil_xls/oil_xls_20240110162000.xls?r=1">
+            Бюллетень по итогам торгов 10.01.2024
+        </a>
+        <a class="accordeon-inner__item-title link pdf" href="/upload/reports/oil_pdf/oil_20240110.pdf">PDF</a>
+    </div>
+    <div class="accordeon-inner__item">
+        <a href="/upload/reports/oil_xls/oil_xls_20240109162000.xls" class="xls  accordeon-inner__item-title link">
+            Бюллетень по итогам торгов 09.01.2024
+        </a>
+        <a class="accordeon-inner__item-title-xls link" href="/ignore.xls">Ignore</a>
+    </div>
+</div>
+"""
+
+
+def test_extractors_agree():
+    from parser.async_pars import extract_xls_links_lxml, extract_xls_links_bs4
+
+    expected = [
+        "/upload/reports/oil_xls/oil_xls_20240110162000.xls?r=1",
+        "/upload/reports/oil_xls/oil_xls_20240109162000.xls",
+    ]
+    assert extract_xls_links_lxml(RESULTS_PAGE) == expected
+    assert extract_xls_links_bs4(RESULTS_PAGE) == expected
+
+
+def test_extract_xls_links_empty_page():
+    from parser.async_pars import extract_xls_links
+
+    assert extract_xls_links("") == []
+
+
+@pytest.mark.asyncio
+async def test_get_ref_without_lxml():
+    mock_session = AsyncMock()
+
+    with patch('parser.async_pars.etree', None), \
+            patch('parser.async_pars.parse', return_value=RESULTS_PAGE):
+        result = await get_ref(0, mock_session)
+
+    assert len(result) == 2
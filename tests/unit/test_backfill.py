@@ -0,0 +1,72 @@
+import pytest
+from datetime import date
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from database import spimex_trading_results, truncate_table
+from parser.backfill import collect_files, parse_bulletin_file, run_backfill
+from parser.parser import read_bulletin, build_records
+
+ROWS = [
+    ("A100ANK060F", "Бензин (АИ-100-К5), ст. Ангарск-группа станций", "ст. Ангарск-группа станций", 60, 5100000, 1),
+    ("A592UFM060F", "Бензин (АИ-92-К5), Уфа", "Уфа (ст. Загородняя)", "-", "-", "-"),
+    ("DTZ005E001B", "ДТ зимнее, НБ Ростов", "НБ Ростов", 120, 7800000, 2),
+]
+
+
+def test_read_bulletin_and_build_records(make_bulletin):
+    path = make_bulletin(date(2024, 3, 5), ROWS)
+
+    records = build_records(read_bulletin(str(path)), date(2024, 3, 5))
+
+    assert [record["exchange_product_id"] for record in records] == ["A100ANK060F", "DTZ005E001B"]
+    assert records[0]["oil_id"] == "A100"
+    assert records[0]["delivery_basis_id"] == "ANK"
+    assert records[0]["delivery_type_id"] == "F"
+    assert records[1]["total"] == 7800000
+    assert records[1]["count"] == 2
+
+
+def test_parse_bulletin_file_reports_errors(tmp_path):
+    path = tmp_path / "oil_xls_20240305162000.xls"
+    path.write_bytes(b"not an excel file")
+
+    result = parse_bulletin_file(str(path), path.name)
+
+    assert result["error"]
+    assert result["records"] == []
+
+
+def test_collect_files(tmp_path, make_bulletin):
+    make_bulletin(date(2024, 3, 5), ROWS)
+    make_bulletin(date(2024, 3, 6), ROWS)
+
+    by_dir = collect_files([str(tmp_path)])
+    by_glob = collect_files([str(tmp_path / "oil_xls_202403*.xls")])
+
+    assert [name for _, name in by_dir] == ["oil_xls_20240305162000.xls", "oil_xls_20240306162000.xls"]
+    assert by_dir == by_glob
+
+
+@pytest.mark.asyncio
+async def test_run_backfill(test_db, test_session, make_bulletin, tmp_path, mocker):
+    mocker.patch('parser.backfill.db.async_session_maker',
+                 sessionmaker(test_db, class_=AsyncSession, expire_on_commit=False))
+    mocker.patch('snapshots.SNAPSHOT_PATH', str(tmp_path / "snapshots"))
+    make_bulletin(date(2024, 3, 5), ROWS)
+    make_bulletin(date(2024, 3, 6), ROWS)
+
+    try:
+        stats = await run_backfill(collect_files([str(tmp_path)]), workers=2)
+        repeated = await run_backfill(collect_files([str(tmp_path)]), workers=2)
+
+        result = await test_session.execute(select(func.count()).select_from(spimex_trading_results))
+        assert result.scalar() == 4
+        assert stats["parsed"] == 2
+        assert stats["rows"] == 4
+        assert repeated["skipped"] == 2
+        assert repeated["rows"] == 0
+        assert (tmp_path / "snapshots" / "spimex_2024_03.parquet").exists()
+    finally:
+        await truncate_table(test_session)
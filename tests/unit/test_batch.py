@@ -0,0 +1,73 @@
+from datetime import date
+
+import httpx
+import pytest
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+from http_cache import set_data_version
+from main import app
+
+QUERIES = [
+    {"endpoint": "get_trading_results"},
+    {"endpoint": "get_trading_results", "oil_id": "A100"},
+    {"endpoint": "get_dynamics", "oil_id": "A100", "start_date": "2023-01-01", "end_date": "2023-01-01"},
+]
+
+
+@pytest.fixture(autouse=True)
+def cache_backend(mocker):
+    mocker.patch('http_cache._version', None)
+    mocker.patch.object(FastAPICache, '_backend', InMemoryBackend())
+
+
+async def post_batch(queries):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.post("/api/batch/", json={"queries": queries})
+
+
+@pytest.mark.asyncio
+async def test_batch_answers_all_filters_with_one_query(test_session, setup_test_data, mocker):
+    execute = mocker.spy(test_session, "execute")
+
+    response = await post_batch(QUERIES)
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert list(results) == [
+        "get_trading_results",
+        "get_trading_results?oil_id=A100",
+        "get_dynamics?oil_id=A100&start_date=2023-01-01&end_date=2023-01-01",
+    ]
+    assert [row["exchange_product_id"] for row in results["get_trading_results"]] == ["A200000T"]
+    assert results["get_trading_results?oil_id=A100"] == []
+    assert sorted(row["exchange_product_id"] for row in results[list(results)[2]]) == ["A100000E", "A100001E"]
+    assert results[list(results)[2]][0]["date"] == "2023-01-01"
+    assert execute.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_reuses_cached_items(test_session, setup_test_data, mocker):
+    set_data_version(date(2023, 1, 2), 1)
+    await post_batch(QUERIES[:2])
+    execute = mocker.spy(test_session, "execute")
+
+    cached = await post_batch(QUERIES[:2])
+    assert execute.call_count == 0
+    assert [row["exchange_product_id"] for row in cached.json()["results"]["get_trading_results"]] == ["A200000T"]
+
+    await post_batch(QUERIES)
+    assert execute.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_validates_periods():
+    missing_period = await post_batch([{"endpoint": "get_dynamics", "oil_id": "A100"}])
+    reversed_period = await post_batch([
+        {"endpoint": "get_dynamics", "start_date": "2023-01-02", "end_date": "2023-01-01"}
+    ])
+    empty = await post_batch([])
+
+    assert missing_period.status_code == 422
+    assert reversed_period.status_code == 422
+    assert empty.status_code == 422
@@ -0,0 +1,36 @@
+import datetime
+import random
+
+from benchmarks.generate_data import generate_bulletins, synthetic_trades
+from benchmarks.report import compare_reports, latency_summary
+from parser.parser import build_records, read_bulletin
+
+
+def test_generated_bulletin_is_parsed(tmp_path):
+    trade_date = datetime.date(2024, 3, 1)
+    trades = synthetic_trades(trade_date, 50, random.Random(0))
+
+    [path] = generate_bulletins(str(tmp_path), 1, 50, end_date=trade_date)
+    records = build_records(read_bulletin(path), trade_date)
+
+    assert path.endswith("oil_xls_20240301162000.xls")
+    assert len(records) == 50
+    assert [record["exchange_product_id"] for record in records] == [trade[0] for trade in trades]
+
+
+def test_latency_summary():
+    summary = latency_summary([i / 1000 for i in range(1, 101)], seconds=2)
+
+    assert summary["requests"] == 100
+    assert summary["rps"] == 50
+    assert 50 <= summary["p50_ms"] <= 51
+    assert 99 <= summary["p99_ms"] <= 100
+
+
+def test_compare_reports_flags_regressions():
+    baseline = {"get_dynamics:cached": {"rps": 100, "p95_ms": 10}, "removed": {"rps": 1}}
+    current = {"get_dynamics:cached": {"rps": 70, "p95_ms": 11}, "added": {"rps": 1}}
+
+    regressions = compare_reports(baseline, current, tolerance=0.2)
+
+    assert regressions == ["get_dynamics:cached: rps 100 -> 70 (-30%)"]
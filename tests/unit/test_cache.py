@@ -114,3 +114,29 @@ async def test_clear_cache_daily_after_1411(mocker):
             assert len(sleep_calls) == 1
             assert sleep_calls[0] == expected_sleep_time
             mock_redis.flushall.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_clear_cache_daily_keeps_other_keys(mocker):
+    invalidate = mocker.patch('cache.invalidate_cache', AsyncMock())
+    mocker.patch('cache.asyncio.sleep', side_effect=[None, StopAsyncIteration("Test completed")])
+
+    with pytest.raises(StopAsyncIteration):
+        await clear_cache_daily()
+
+    invalidate.assert_awaited_once()
+
+
+def test_cache_key_builder_ignores_session(test_session):
+    from cache import cache_key_builder
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    async def endpoint():
+        pass
+
+    first = cache_key_builder(endpoint, "ns", args=(), kwargs={"oil_id": "A100", "session": test_session})
+    second = cache_key_builder(endpoint, "ns", args=(), kwargs={"oil_id": "A100", "session": AsyncSession()})
+    other = cache_key_builder(endpoint, "ns", args=(), kwargs={"oil_id": "A592", "session": test_session})
+
+    assert first == second
+    assert first != other
@@ -1,3 +1,7 @@
+import os
+import subprocess
+import sys
+
 import pytest
 from datetime import date
 from sqlalchemy import select
@@ -86,3 +90,32 @@ async def test_create_table(test_session):
 
     result = await create_table()
     assert result is False
+
+
+@pytest.mark.asyncio
+async def test_ingest_run_progress(test_session):
+    from database import (
+        finish_ingest_run, get_run_progress, get_unfinished_run, set_run_page, spimex_ingest_checkpoints,
+        start_ingest_run
+    )
+
+    run = await start_ingest_run(test_session, "test")
+    assert (await get_unfinished_run(test_session, "test")).id == run.id
+
+    test_session.add(spimex_ingest_checkpoints(run_id=run.id, url="url1", page=0))
+    await test_session.commit()
+    await set_run_page(test_session, run.id, 1)
+    assert await get_run_progress(test_session, run.id) == (1, {"url1"})
+
+    await finish_ingest_run(test_session, run.id)
+    assert await get_unfinished_run(test_session, "test") is None
+
+
+@pytest.mark.parametrize("strategy,valid", [("pre_ping", True), ("recycle", True), ("preping", False)])
+def test_ping_strategy_is_validated_at_startup(strategy, valid):
+    result = subprocess.run([sys.executable, "-c", "import config; print(config.DB_PING_STRATEGY)"],
+                            env={**os.environ, "DB_PING_STRATEGY": strategy}, capture_output=True, text=True)
+
+    assert (result.returncode == 0) is valid
+    if not valid:
+        assert "DB_PING_STRATEGY" in result.stderr
@@ -0,0 +1,105 @@
+import asyncio
+import json
+from datetime import date
+from unittest.mock import AsyncMock
+
+import fakeredis
+import pytest
+
+import events
+from events import EventHub, event_stream, format_event, publish_trading_day
+
+
+@pytest.fixture
+def hub(mocker):
+    hub = EventHub()
+    mocker.patch('events.hub', hub)
+    return hub
+
+
+def test_broadcast_reaches_every_subscriber(hub):
+    with hub.subscribe() as first, hub.subscribe() as second:
+        hub.broadcast({"date": "2024-01-10", "version": "20240110-1"})
+
+        assert first.get_nowait()["date"] == "2024-01-10"
+        assert second.get_nowait()["date"] == "2024-01-10"
+    assert not hub.subscribers
+
+
+def test_slow_subscriber_keeps_latest_events(hub):
+    with hub.subscribe() as queue:
+        for day in range(1, events.QUEUE_SIZE + 3):
+            hub.broadcast({"date": f"2024-01-{day:02d}", "version": None})
+
+        assert queue.qsize() == events.QUEUE_SIZE
+        assert [queue.get_nowait() for _ in range(events.QUEUE_SIZE)][-1]["date"] == f"2024-01-{events.QUEUE_SIZE + 2:02d}"
+
+
+@pytest.mark.asyncio
+async def test_diff_is_loaded_once_per_event(hub, mocker):
+    load = mocker.patch('events.load_day_results', AsyncMock(return_value='[{"oil_id": "A592"}]'))
+    event = {"date": "2024-01-10", "version": "20240110-1"}
+    hub.broadcast(event)
+
+    diffs = await asyncio.gather(*(hub.diff(event) for _ in range(100)))
+
+    assert set(diffs) == {'[{"oil_id": "A592"}]'}
+    load.assert_called_once_with(date(2024, 1, 10))
+
+
+def test_format_event():
+    event = {"date": "2024-01-10", "version": "20240110-1"}
+
+    assert format_event(event) == \
+        'event: trading_day\nid: 20240110-1\ndata: {"date": "2024-01-10", "version": "20240110-1"}\n\n'
+    data = format_event(event, '[{"oil_id": "A592"}]').split("data: ")[1]
+    assert json.loads(data)["results"] == [{"oil_id": "A592"}]
+
+
+@pytest.mark.asyncio
+async def test_event_stream_sends_events_and_heartbeats(hub, mocker):
+    mocker.patch('events.HEARTBEAT_INTERVAL', 0.01)
+
+    with hub.subscribe() as queue:
+        stream = event_stream(queue)
+        assert (await stream.__anext__()).startswith("retry:")
+        assert await stream.__anext__() == ": ping\n\n"
+
+        hub.broadcast({"date": "2024-01-10", "version": "20240110-1"})
+        assert "2024-01-10" in await stream.__anext__()
+        await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_reconnect_gets_missed_event(hub):
+    hub.broadcast({"date": "2024-01-10", "version": "20240110-2"})
+
+    with hub.subscribe() as queue:
+        stream = event_stream(queue, last_event_id="20240110-1")
+        await stream.__anext__()
+        assert "id: 20240110-2" in await stream.__anext__()
+        await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_fan_out_through_redis(hub, mocker):
+    redis = fakeredis.FakeAsyncRedis()
+    mocker.patch('events.get_redis', return_value=redis)
+    listener = asyncio.create_task(hub.listen())
+    await asyncio.sleep(0.05)
+
+    with hub.subscribe() as queue:
+        await publish_trading_day(date(2024, 1, 10), "20240110-1")
+        event = await asyncio.wait_for(queue.get(), 1)
+
+    listener.cancel()
+    assert event == {"date": "2024-01-10", "version": "20240110-1"}
+
+
+@pytest.mark.asyncio
+async def test_publish_without_redis_is_local(hub, mocker):
+    mocker.patch('events.get_redis', return_value=None)
+
+    with hub.subscribe() as queue:
+        await publish_trading_day(date(2024, 1, 10))
+        assert queue.get_nowait() == {"date": "2024-01-10", "version": None}
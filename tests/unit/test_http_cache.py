@@ -0,0 +1,240 @@
+import gzip
+from datetime import date
+from unittest.mock import AsyncMock
+
+import fakeredis
+import brotli
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+import http_cache
+from http_cache import CompressionMiddleware, ConditionalGetMiddleware, current_etag, etag_matches, \
+    load_data_version, negotiate_encoding, publish_data_version, set_data_version, sync_data_version
+
+
+@pytest.fixture(autouse=True)
+def reset_version(mocker):
+    mocker.patch('http_cache._version', None)
+
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+    app.add_middleware(ConditionalGetMiddleware)
+    app.state.calls = 0
+
+    @app.get("/api/items/")
+    async def get_items():
+        app.state.calls += 1
+        return [1, 2, 3]
+
+    return app
+
+
+async def get(app, path, headers=None):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get(path, headers=headers)
+
+
+@pytest.mark.asyncio
+async def test_response_carries_etag_and_no_cache(app):
+    set_data_version(date(2024, 1, 10), 3)
+
+    response = await get(app, "/api/items/")
+
+    assert response.status_code == 200
+    assert response.headers["etag"] == 'W/"20240110-3"'
+    assert response.headers["cache-control"] == "no-cache"
+
+
+@pytest.mark.asyncio
+async def test_export_is_not_conditional(app):
+    @app.get("/api/export/")
+    async def export():
+        return PlainTextResponse("a,b\n")
+
+    set_data_version(date(2024, 1, 10), 3)
+
+    response = await get(app, "/api/export/", headers={"If-None-Match": 'W/"20240110-3"'})
+
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+    assert "cache-control" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_not_modified_carries_cors_headers():
+    from main import app as main_app
+
+    set_data_version(date(2024, 1, 10), 3)
+
+    response = await get(main_app, "/api/get_last_trading_dates/",
+                         headers={"If-None-Match": 'W/"20240110-3"', "Origin": "https://example.com"})
+
+    assert response.status_code == 304
+    assert response.headers["access-control-allow-origin"] == "*"
+
+
+@pytest.mark.asyncio
+async def test_if_none_match_returns_304_without_calling_endpoint(app):
+    set_data_version(date(2024, 1, 10), 3)
+
+    response = await get(app, "/api/items/", headers={"If-None-Match": 'W/"20240110-3"'})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == 'W/"20240110-3"'
+    assert app.state.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_new_version_invalidates_etag(app):
+    set_data_version(date(2024, 1, 10), 3)
+    etag = current_etag()
+    set_data_version(date(2024, 1, 11), 4)
+
+    response = await get(app, "/api/items/", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert app.state.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_no_etag_until_version_is_loaded(app):
+    response = await get(app, "/api/items/", headers={"If-None-Match": "*"})
+
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+
+
+def test_etag_matches():
+    assert etag_matches('"a-1", W/"b-2"', 'W/"b-2"')
+    assert etag_matches('"b-2"', 'W/"b-2"')
+    assert etag_matches('*', 'W/"b-2"')
+    assert not etag_matches('W/"b-1"', 'W/"b-2"')
+
+
+@pytest.mark.asyncio
+async def test_version_is_shared_through_redis(mocker):
+    redis = fakeredis.FakeAsyncRedis()
+    mocker.patch('http_cache.get_redis', return_value=redis)
+    mocker.patch('http_cache.db.get_last_trading_date', AsyncMock(return_value=date(2024, 1, 10)))
+
+    await publish_data_version(session=None)
+    await publish_data_version(session=None)
+    assert current_etag() == 'W/"20240110-2"'
+
+    set_data_version(None, 0)
+    await sync_data_version()
+    assert current_etag() == 'W/"20240110-2"'
+
+
+@pytest.mark.asyncio
+async def test_publish_without_redis_counts_locally(mocker):
+    mocker.patch('http_cache.get_redis', return_value=None)
+    mocker.patch('http_cache.db.get_last_trading_date', AsyncMock(return_value=None))
+
+    await publish_data_version(session=None)
+    await publish_data_version(session=None)
+
+    assert http_cache._version == "empty-2"
+
+
+@pytest.mark.asyncio
+async def test_load_survives_redis_outage(mocker):
+    redis = mocker.MagicMock()
+    redis.get = AsyncMock(side_effect=ConnectionError("redis is down"))
+    mocker.patch('http_cache.get_redis', return_value=redis)
+    mocker.patch('http_cache.db.get_last_trading_date', AsyncMock(return_value=date(2024, 1, 10)))
+
+    await load_data_version(session=None)
+
+    assert http_cache._version == "20240110-0"
+
+
+ROWS = [{"exchange_product_name": "Бензин (АИ-92-К5) по ГОСТ, ст. Ангарск-группа станций", "volume": i}
+        for i in range(200)]
+
+
+@pytest.fixture
+def compressed_app(mocker):
+    mocker.patch.object(FastAPICache, '_backend', InMemoryBackend())
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(ConditionalGetMiddleware)
+    app.state.calls = 0
+
+    @app.get("/api/rows/")
+    async def get_rows():
+        app.state.calls += 1
+        return ROWS
+
+    @app.get("/api/small/")
+    async def get_small():
+        return {"ok": True}
+
+    return app
+
+
+async def get_raw(app, path, headers):
+    """Запрос без автоматической распаковки тела клиентом"""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        request = client.build_request("GET", path, headers=headers)
+        response = await client.send(request, stream=True)
+        body = b"".join([chunk async for chunk in response.aiter_raw()])
+        await response.aclose()
+        return response, body
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip, deflate, br") == "br"
+    assert negotiate_encoding("gzip, br;q=0.5") == "gzip"
+    assert negotiate_encoding("*") == "br"
+    assert negotiate_encoding("gzip;q=0, br;q=0") is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("") is None
+
+
+@pytest.mark.asyncio
+async def test_gzip_response(compressed_app):
+    response, body = await get_raw(compressed_app, "/api/rows/", {"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) == len(body)
+    assert httpx.Response(200, content=gzip.decompress(body)).json() == ROWS
+
+
+@pytest.mark.asyncio
+async def test_compressed_body_is_cached_per_version(compressed_app):
+    set_data_version(date(2024, 1, 10), 1)
+    headers = {"Accept-Encoding": "br"}
+
+    first, first_body = await get_raw(compressed_app, "/api/rows/", headers)
+    second, second_body = await get_raw(compressed_app, "/api/rows/", headers)
+    assert compressed_app.state.calls == 1
+    assert second.headers["content-encoding"] == "br"
+    assert second.headers["etag"] == 'W/"20240110-1"'
+    assert first_body == second_body
+    assert httpx.Response(200, content=brotli.decompress(second_body)).json() == ROWS
+
+    await get_raw(compressed_app, "/api/rows/", {"Accept-Encoding": "br", "Cache-Control": "no-store"})
+    assert compressed_app.state.calls == 2
+
+    set_data_version(date(2024, 1, 11), 2)
+    await get_raw(compressed_app, "/api/rows/", headers)
+    assert compressed_app.state.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_small_and_unaccepted_responses_are_not_compressed(compressed_app):
+    small, _ = await get_raw(compressed_app, "/api/small/", {"Accept-Encoding": "gzip"})
+    plain, body = await get_raw(compressed_app, "/api/rows/", {"Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in small.headers
+    assert "content-encoding" not in plain.headers
+    assert httpx.Response(200, content=body).json() == ROWS
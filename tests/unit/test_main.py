@@ -0,0 +1,14 @@
+import subprocess
+import sys
+
+
+def test_api_import_skips_ingestion_stack():
+    # Отдельный процесс: в процессе тестов парсер уже импортирован другими тестами
+    code = (
+        "import sys, main; "
+        "print('loaded:' + ','.join(m for m in ('pandas', 'pyarrow', 'aiohttp', 'lxml', 'parser.parser', 'scheduler') "
+        "if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip().splitlines()[-1] == "loaded:"
@@ -0,0 +1,97 @@
+import random
+from datetime import date, timedelta
+
+import httpx
+import pytest
+
+import memory_snapshot
+from http_cache import set_data_version
+from main import app
+from memory_snapshot import TradingSnapshot, get_snapshot, rebuild_snapshot
+
+
+def make_rows(days=10, per_day=50, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for day in range(days):
+        for _ in range(per_day):
+            oil_id, basis, delivery = rng.choice(["A100", "A592", "DTZ0"]), rng.choice(["ANK", "UFM"]), rng.choice("AF")
+            rows.append({
+                "exchange_product_id": f"{oil_id}{basis}060{delivery}", "exchange_product_name": "Бензин",
+                "oil_id": oil_id, "delivery_basis_id": basis, "delivery_basis_name": basis,
+                "delivery_type_id": delivery, "volume": 60.0, "total": 3000000, "count": 1,
+                "date": date(2024, 1, 1) + timedelta(days=day),
+            })
+    rng.shuffle(rows)
+    return rows
+
+
+@pytest.fixture(autouse=True)
+def reset_state(mocker):
+    mocker.patch('http_cache._version', None)
+    mocker.patch('memory_snapshot._snapshot', None)
+
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {"oil_id": "A592"},
+    {"oil_id": "A100", "delivery_basis_id": "UFM"},
+    {"oil_id": "DTZ0", "delivery_basis_id": "ANK", "delivery_type_id": "F"},
+    {"oil_id": "NONE"},
+])
+def test_select_matches_full_scan(filters):
+    rows = make_rows()
+    snapshot = TradingSnapshot("v", rows)
+    start, end = date(2024, 1, 3), date(2024, 1, 6)
+
+    expected = [row for row in rows if start <= row["date"] <= end
+                and all(row[field] == value for field, value in filters.items())]
+    result = snapshot.select(start, end, **filters)
+
+    key = lambda row: (row["date"], row["exchange_product_id"])
+    assert sorted(result, key=key) == sorted(expected, key=key)
+
+
+def test_covers_and_bounds():
+    snapshot = TradingSnapshot("v", make_rows(days=3))
+
+    assert snapshot.first_date == date(2024, 1, 1)
+    assert snapshot.last_date == date(2024, 1, 3)
+    assert snapshot.covers(date(2024, 1, 2))
+    assert not snapshot.covers(date(2023, 12, 31))
+    assert not TradingSnapshot("v", []).covers(date(2024, 1, 1))
+
+
+@pytest.mark.asyncio
+async def test_rebuild_keeps_latest_days_for_current_version(test_session, setup_test_data):
+    set_data_version(date(2023, 1, 2), 1)
+
+    snapshot = await rebuild_snapshot(test_session, days=1)
+
+    assert get_snapshot() is snapshot
+    assert [row["exchange_product_id"] for row in snapshot.select(date(2023, 1, 2), date(2023, 1, 2))] == ["A200000T"]
+    set_data_version(date(2023, 1, 2), 2)
+    assert get_snapshot() is None
+
+
+@pytest.mark.asyncio
+async def test_endpoints_are_served_from_snapshot(test_session, setup_test_data, mocker):
+    set_data_version(date(2023, 1, 2), 1)
+    await rebuild_snapshot(test_session)
+    execute = mocker.spy(test_session, "execute")
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        latest = await client.get("/api/get_trading_results/")
+        dynamics = await client.get("/api/get_dynamics/", params={
+            "oil_id": "A100", "start_date": "2023-01-01", "end_date": "2023-01-02"
+        })
+        missing = await client.get("/api/get_trading_results/", params={"oil_id": "A100"})
+        assert execute.call_count == 0
+
+        bypass = await client.get("/api/get_trading_results/", headers={"Cache-Control": "no-store"})
+        assert execute.call_count > 0
+
+    assert [row["exchange_product_id"] for row in latest.json()] == ["A200000T"]
+    assert sorted(row["exchange_product_id"] for row in dynamics.json()) == ["A100000E", "A100001E"]
+    assert missing.status_code == 404
+    assert bypass.json() == latest.json()
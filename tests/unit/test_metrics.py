@@ -0,0 +1,70 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from conftest import TEST_DATABASE_URL
+from metrics import InstrumentedBackend, MetricsMiddleware, TimedQueuePool, instrument_engine, render_metrics
+
+
+def sample(name, labels=None):
+    return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+
+@pytest.mark.asyncio
+async def test_instrumented_backend_counts_hits_and_misses():
+    backend = InstrumentedBackend(InMemoryBackend())
+    hits, misses = sample("cache_requests_total", {"result": "hit"}), sample("cache_requests_total", {"result": "miss"})
+
+    await backend.get_with_ttl("metrics-test-key")
+    await backend.set("metrics-test-key", b"value", 60)
+    ttl, value = await backend.get_with_ttl("metrics-test-key")
+
+    assert value == b"value"
+    assert sample("cache_requests_total", {"result": "miss"}) == misses + 1
+    assert sample("cache_requests_total", {"result": "hit"}) == hits + 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_middleware_uses_route_template():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"id": item_id}
+
+    labels = {"method": "GET", "route": "/items/{item_id}", "status": "200"}
+    before = sample("http_request_duration_seconds_count", labels)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        await client.get("/items/1")
+        await client.get("/items/2")
+
+    assert sample("http_request_duration_seconds_count", labels) == before + 2
+
+
+@pytest.mark.asyncio
+async def test_instrument_engine_records_queries_and_checkouts():
+    engine = create_async_engine(TEST_DATABASE_URL, poolclass=TimedQueuePool)
+    instrument_engine(engine)
+    queries = sample("db_query_duration_seconds_count", {"statement": "SELECT"})
+    checkouts = sample("db_pool_checkout_wait_seconds_count")
+
+    async with engine.connect() as conn:
+        assert sample("db_pool_checked_out") >= 1
+        await conn.execute(text("SELECT 1"))
+    await engine.dispose()
+
+    assert sample("db_query_duration_seconds_count", {"statement": "SELECT"}) >= queries + 1
+    assert sample("db_pool_checkout_wait_seconds_count") == checkouts + 1
+
+
+def test_render_metrics():
+    content, content_type = render_metrics()
+
+    assert b"http_request_duration_seconds" in content
+    assert content_type.startswith("text/plain")
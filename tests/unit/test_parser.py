@@ -48,3 +48,101 @@ async def test_parse_table_skip_old_file(mocker):
     mock_read_excel.assert_not_called()
     mock_save.assert_not_called()
     mock_remove.assert_called_once_with('trades_file\oil_xls_20201204162000.xls')
+
+
+@pytest.mark.asyncio
+async def test_run_parser_stops_at_start_date(mocker):
+    from datetime import date
+
+    mock_get_urls = mocker.patch('parser.parser.get_tables_urls')
+    mock_download = mocker.patch('parser.parser.download_xls')
+    mock_parse = mocker.patch('parser.parser.parse_table')
+
+    mock_get_urls.side_effect = [
+        ['/upload/reports/oil_xls/oil_xls_20240110162000.xls', '/upload/reports/oil_xls/oil_xls_20240109162000.xls'],
+        ['/upload/reports/oil_xls/oil_xls_20240108162000.xls', '/upload/reports/oil_xls/oil_xls_20240105162000.xls'],
+        ['/upload/reports/oil_xls/oil_xls_20240104162000.xls'],
+    ]
+    mock_download.return_value = 'test_file.xls'
+    mock_parse.return_value = None
+
+    await run_parser(start_date=date(2024, 1, 8))
+
+    assert mock_get_urls.call_count == 2
+    assert mock_download.call_count == 3
+    assert mock_parse.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_run_parser_skips_page_without_new_files(mocker):
+    from datetime import date
+
+    mock_get_urls = mocker.patch('parser.parser.get_tables_urls')
+    mock_download = mocker.patch('parser.parser.download_xls')
+
+    mock_get_urls.return_value = ['/upload/reports/oil_xls/oil_xls_20240105162000.xls']
+
+    await run_parser(start_date=date(2024, 1, 8))
+
+    assert mock_get_urls.call_count == 1
+    mock_download.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_ingest_start_date(mocker):
+    from datetime import date
+    from parser.parser import get_ingest_start_date
+
+    mocker.patch('parser.parser.db.get_last_trading_date', return_value=date(2024, 5, 31))
+    assert await get_ingest_start_date(None) == date(2024, 6, 1)
+
+    mocker.patch('parser.parser.db.get_last_trading_date', return_value=None)
+    assert await get_ingest_start_date(None) == date(2024, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_run_parser_resumes_from_checkpoint(mocker):
+    from unittest.mock import AsyncMock, MagicMock
+
+    maker = MagicMock()
+    maker.return_value.__aenter__ = AsyncMock()
+    maker.return_value.__aexit__ = AsyncMock(return_value=False)
+    mocker.patch('parser.parser.db.async_session_maker', maker)
+    mocker.patch('parser.parser.db.get_run_progress', return_value=(1, {'url2'}))
+    mock_set_page = mocker.patch('parser.parser.db.set_run_page')
+    mock_get_urls = mocker.patch('parser.parser.get_tables_urls', return_value=['url2', 'url3'])
+    mock_download = mocker.patch('parser.parser.download_xls', return_value='test_file.xls')
+    mock_parse = mocker.patch('parser.parser.parse_table', return_value=True)
+
+    await run_parser(max_pages=2, run_id=7)
+
+    mock_get_urls.assert_called_once_with(1)
+    mock_download.assert_called_once_with('https://spimex.com/url3')
+    mock_parse.assert_called_once_with('test_file.xls', {'run_id': 7, 'url': 'url3', 'page': 1})
+    assert mock_set_page.call_args.args[1:] == (7, 2)
+
+
+@pytest.mark.asyncio
+async def test_save_records_keeps_checkpoint_with_file(test_session):
+    from datetime import date
+    from sqlalchemy import select
+    from sqlalchemy.exc import IntegrityError
+    from database import spimex_ingest_checkpoints, spimex_ingested_files
+    from parser.parser import save_records
+
+    checkpoint = {'run_id': 100, 'url': 'oil_xls_20240110162000.xls', 'page': 0}
+    await save_records(test_session, [], date(2024, 1, 10), 'oil_xls_20240110162000.xls', 'sha-resume', checkpoint)
+
+    # Повторная запись того же файла откатывается вместе со своей контрольной точкой
+    with pytest.raises(IntegrityError):
+        await save_records(test_session, [], date(2024, 1, 10), 'copy.xls', 'sha-resume',
+                           {'run_id': 100, 'url': 'copy.xls', 'page': 0})
+    await test_session.rollback()
+
+    urls = await test_session.scalars(
+        select(spimex_ingest_checkpoints.url).where(spimex_ingest_checkpoints.run_id == 100)
+    )
+    assert list(urls) == ['oil_xls_20240110162000.xls']
+    await test_session.execute(spimex_ingested_files.__table__.delete())
+    await test_session.execute(spimex_ingest_checkpoints.__table__.delete())
+    await test_session.commit()
@@ -0,0 +1,20 @@
+import httpx
+import pytest
+
+import database as db
+from main import app
+from routers.refresh import REFRESH_LOCK_KEY
+
+
+@pytest.mark.asyncio
+async def test_concurrent_refresh_is_rejected(test_db, test_session, mocker):
+    mocker.patch('database.async_engine', test_db)
+    run_parser = mocker.patch('parser.parser.run_parser')
+
+    async with db.advisory_lock(REFRESH_LOCK_KEY) as locked:
+        assert locked is True
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.delete("/")
+
+    assert response.status_code == 409
+    run_parser.assert_not_called()
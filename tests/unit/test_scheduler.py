@@ -0,0 +1,76 @@
+import pytest
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock
+
+import scheduler
+
+
+@pytest.fixture
+def session_maker(mocker):
+    maker = MagicMock()
+    maker.return_value.__aenter__ = AsyncMock()
+    maker.return_value.__aexit__ = AsyncMock(return_value=False)
+    mocker.patch('scheduler.db.async_session_maker', maker)
+    return maker
+
+
+@pytest.mark.asyncio
+async def test_ingest_leadership_is_exclusive(test_db, mocker):
+    mocker.patch('scheduler.db.async_engine', test_db)
+
+    async with scheduler.ingest_leadership() as first:
+        async with scheduler.ingest_leadership() as second:
+            assert first is True
+            assert second is False
+
+    async with scheduler.ingest_leadership() as again:
+        assert again is True
+
+
+@pytest.mark.asyncio
+async def test_ingest_leadership_keeps_request_pool(test_db, mocker):
+    mocker.patch('scheduler.db.async_engine', test_db)
+
+    async with scheduler.ingest_leadership() as leader:
+        # Блокировка держится все окно опроса на соединении вне пула запросов API
+        assert leader is True
+        assert test_db.pool.checkedout() == 0
+
+
+@pytest.mark.asyncio
+async def test_ingest_new_bulletins_nothing_new(session_maker, mocker):
+    mocker.patch('scheduler.get_ingest_start_date', return_value=date(2024, 1, 11))
+    mocker.patch('scheduler.get_tables_urls', return_value=[
+        '/upload/reports/oil_xls/oil_xls_20240110162000.xls',
+        '/upload/reports/oil_xls/oil_xls_20240109162000.xls',
+    ])
+    mock_run_parser = mocker.patch('scheduler.run_parser')
+    mock_invalidate = mocker.patch('scheduler.invalidate_cache')
+
+    assert await scheduler.ingest_new_bulletins(app=None) is False
+    mock_run_parser.assert_not_called()
+    mock_invalidate.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_ingest_new_bulletins_loads_and_warms(session_maker, mocker):
+    mocker.patch('scheduler.get_ingest_start_date', return_value=date(2024, 1, 10))
+    mocker.patch('scheduler.get_tables_urls', return_value=[
+        '/upload/reports/oil_xls/oil_xls_20240110162000.xls',
+        '/upload/reports/oil_xls/oil_xls_20240109162000.xls',
+    ])
+    mocker.patch('scheduler.db.get_last_trading_date', return_value=date(2024, 1, 10))
+    mock_run_parser = mocker.patch('scheduler.run_parser')
+    mock_rebuild = mocker.patch('scheduler.snapshots.rebuild_snapshots')
+    mock_invalidate = mocker.patch('scheduler.invalidate_cache')
+    mock_publish = mocker.patch('scheduler.publish_data_version')
+    mock_warm = mocker.patch('scheduler.warm_cache')
+    mock_push = mocker.patch('scheduler.publish_trading_day')
+
+    assert await scheduler.ingest_new_bulletins(app="app") is True
+    mock_run_parser.assert_called_once_with(start_date=date(2024, 1, 10))
+    mock_rebuild.assert_called_once()
+    mock_invalidate.assert_called_once()
+    mock_publish.assert_called_once()
+    mock_warm.assert_called_once_with("app")
+    assert mock_push.call_args.args[0] == date(2024, 1, 10)
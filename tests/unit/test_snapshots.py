@@ -0,0 +1,88 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datetime import date
+from sqlalchemy import select
+
+import snapshots
+from database import spimex_trading_results
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path, mocker):
+    mocker.patch('snapshots.SNAPSHOT_PATH', str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.asyncio
+async def test_snapshot_matches_database(test_session, setup_test_data, snapshot_dir):
+    count = await snapshots.rebuild_snapshots(test_session)
+    assert count == 1
+
+    paths = await snapshots.ensure_snapshots(test_session, date(2023, 1, 1), date(2023, 1, 31))
+    table = snapshots.read_range(paths, date(2023, 1, 1), date(2023, 1, 31))
+
+    columns = [getattr(spimex_trading_results, name) for name in snapshots.SNAPSHOT_COLUMNS]
+    result = await test_session.execute(select(*columns))
+    rows = result.all()
+
+    assert table.num_rows == len(rows) == 3
+    assert snapshots.table_checksum(table) == snapshots.rows_checksum(rows)
+
+
+@pytest.mark.asyncio
+async def test_snapshot_range_filter(test_session, setup_test_data, snapshot_dir):
+    paths = await snapshots.ensure_snapshots(test_session, date(2023, 1, 2), date(2023, 1, 2))
+    table = snapshots.read_range(paths, date(2023, 1, 2), date(2023, 1, 2))
+
+    assert table.num_rows == 1
+    assert table.column("oil_id").to_pylist() == ["A200"]
+
+
+@pytest.mark.asyncio
+async def test_stream_arrow_and_parquet(test_session, setup_test_data, snapshot_dir):
+    paths = await snapshots.ensure_snapshots(test_session, date(2023, 1, 1), date(2023, 1, 2))
+
+    arrow_table = pa.ipc.open_stream(
+        b"".join(snapshots.stream_arrow(paths, date(2023, 1, 1), date(2023, 1, 2)))
+    ).read_all()
+    parquet_table = pq.read_table(pa.BufferReader(
+        b"".join(snapshots.stream_parquet(paths, date(2023, 1, 1), date(2023, 1, 2)))
+    ))
+
+    assert arrow_table.num_rows == parquet_table.num_rows == 3
+    assert snapshots.table_checksum(arrow_table) == snapshots.table_checksum(parquet_table)
+
+
+@pytest.mark.asyncio
+async def test_ensure_snapshots_skips_empty_months(test_session, setup_test_data, snapshot_dir):
+    paths = await snapshots.ensure_snapshots(test_session, date(2022, 11, 1), date(2022, 12, 31))
+
+    assert paths == []
+    assert list(snapshot_dir.iterdir()) == []
+
+
+def test_concurrent_writes_do_not_share_temp_file(snapshot_dir):
+    table = pa.Table.from_pylist([{"id": i, "date": date(2023, 1, 2)} for i in range(1000)],
+                                 schema=snapshots.SNAPSHOT_SCHEMA)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        paths = list(pool.map(lambda _: snapshots.write_snapshot(table, date(2023, 1, 1)), range(16)))
+
+    assert set(paths) == {snapshots.snapshot_file(date(2023, 1, 1))}
+    assert [path.name for path in snapshot_dir.iterdir()] == ["spimex_2023_01.parquet"]
+    assert pq.read_table(paths[0]).num_rows == 1000
+
+
+@pytest.mark.asyncio
+async def test_concurrent_exports_build_month_once(test_session, setup_test_data, snapshot_dir, mocker):
+    fetch = mocker.spy(snapshots, "fetch_month_table")
+
+    results = await asyncio.gather(*(
+        snapshots.ensure_snapshots(test_session, date(2023, 1, 1), date(2023, 1, 31)) for _ in range(3)
+    ))
+
+    assert fetch.call_count == 1
+    assert all(paths == results[0] for paths in results)
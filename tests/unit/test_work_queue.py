@@ -0,0 +1,122 @@
+import asyncio
+from datetime import date
+from unittest.mock import AsyncMock
+
+import fakeredis
+import pytest
+
+from parser import work_queue
+from parser.work_queue import ack, claim, enqueue, nack, requeue_expired, seal, start_job
+
+URLS = [f"https://spimex.com/upload/reports/oil_xls/oil_xls_202401{day:02d}162000.xls" for day in range(10, 14)]
+
+
+@pytest.fixture
+def redis():
+    return fakeredis.FakeAsyncRedis()
+
+
+@pytest.mark.asyncio
+async def test_barrier_completes_once_after_all_acks(redis):
+    await start_job(redis, date(2024, 1, 10))
+    await enqueue(redis, URLS[:2])
+
+    first = await claim(redis, timeout=0.1)
+    assert await ack(redis, first) is False
+    assert await seal(redis) is False
+
+    second = await claim(redis, timeout=0.1)
+    assert await ack(redis, second) is True
+    # Повторное подтверждение и повторная проверка барьера не завершают задание второй раз
+    assert await ack(redis, second) is False
+    assert await seal(redis) is False
+    assert await claim(redis, timeout=0.1) is None
+
+
+@pytest.mark.asyncio
+async def test_seal_completes_when_workers_finished_first(redis):
+    await start_job(redis, date(2024, 1, 10))
+    await enqueue(redis, URLS[:1])
+
+    assert await ack(redis, await claim(redis, timeout=0.1)) is False
+    assert await seal(redis) is True
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_requeued(redis):
+    await start_job(redis, date(2024, 1, 10))
+    await enqueue(redis, URLS[:2])
+
+    expired = await claim(redis, timeout=0.1, lease=-1)
+    held = await claim(redis, timeout=0.1, lease=60)
+
+    assert await requeue_expired(redis) == 1
+    assert await claim(redis, timeout=0.1) == expired
+    assert held != expired
+
+
+@pytest.mark.asyncio
+async def test_claim_without_lease_is_recovered(redis):
+    await start_job(redis, date(2024, 1, 10))
+    await enqueue(redis, URLS[:1])
+    # Воркер упал между BLMOVE и ZADD
+    await redis.blmove(work_queue.PENDING_KEY, work_queue.PROCESSING_KEY, 0.1, "LEFT", "RIGHT")
+
+    assert await requeue_expired(redis, lease=-1) == 1
+    assert await claim(redis, timeout=0.1) == URLS[0]
+
+
+@pytest.mark.asyncio
+async def test_nack_retries_then_fails(redis):
+    await start_job(redis, date(2024, 1, 10))
+    await enqueue(redis, URLS[:1])
+    await seal(redis)
+
+    assert await nack(redis, await claim(redis, timeout=0.1), max_attempts=2) is False
+    assert await nack(redis, await claim(redis, timeout=0.1), max_attempts=2) is True
+    assert await redis.smembers(work_queue.FAILED_KEY) == {URLS[0].encode()}
+
+
+@pytest.mark.asyncio
+async def test_workers_drain_queue_and_finish_once(redis, mocker):
+    processed = []
+
+    async def process(url):
+        if url == URLS[1] and URLS[1] not in processed:
+            processed.append(url)
+            raise ConnectionError("reset by peer")
+        await asyncio.sleep(0)
+        processed.append(url)
+
+    mocker.patch('parser.work_queue.process_url', side_effect=process)
+    mocker.patch('parser.work_queue.get_tables_urls',
+                 side_effect=[[url.removeprefix("https://spimex.com/") for url in URLS[:2]],
+                              [url.removeprefix("https://spimex.com/") for url in URLS[2:]], []])
+    finish = mocker.patch('parser.work_queue.finish_job', AsyncMock())
+
+    await work_queue.enqueue_bulletins(redis, start_date=date(2024, 1, 1))
+    workers = [work_queue.run_queue_worker(redis, concurrency=2, exit_when_done=True) for _ in range(2)]
+    counts = await asyncio.wait_for(asyncio.gather(*workers), timeout=10)
+
+    assert sorted(set(processed)) == URLS
+    assert sum(counts) == len(URLS) + 1
+    finish.assert_awaited_once()
+    assert await redis.scard(work_queue.DONE_KEY) == len(URLS)
+
+
+@pytest.mark.asyncio
+async def test_failed_finish_is_retried(redis, mocker):
+    mocker.patch('parser.work_queue.process_url', AsyncMock())
+    finish = mocker.patch('parser.work_queue.finish_job',
+                          AsyncMock(side_effect=[ConnectionError("database is down"), None]))
+    await start_job(redis, date(2024, 1, 10))
+    await enqueue(redis, URLS[:2])
+    await seal(redis)
+
+    # Ошибка завершения не останавливает воркер, а задание не отмечается завершенным до успеха
+    count = await asyncio.wait_for(work_queue.run_queue_worker(redis, concurrency=2, exit_when_done=True), timeout=10)
+
+    assert count == 2
+    assert finish.await_count == 2
+    assert await redis.exists(work_queue.COMPLETED_KEY)
+    assert not await redis.exists(work_queue.FINISHING_KEY)